@@ -0,0 +1,281 @@
+"""Benchmark the broker and UI paths against the simulated broker.
+
+Runs without a Sinopac account, CA file or any bot settings, for example:
+
+    python bench.py --orders 1000 --latency 0.02 --rate-limit 25 --json bench.json
+    python bench.py --compare bench.json --tolerance 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from bot.config import DEFAULT_ACCOUNT, Account, Config
+from bot.contracts import ContractCatalog
+from bot.db.models.order import ORDER_CACHE, Order
+from bot.executor import PriorityExecutor
+from bot.placement import TRANSIENT_ERRORS, PlacementEngine, prepare_order
+from bot.sim import SimBrokerError, SimMarket, SimShioaji, TickReplay
+from bot.trade_book import TradeBook
+from bot.triggers import TriggerIndex
+from bot.ui.order import OrderManageView
+from bot.ui.trade import TradeManageView
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Sequence
+
+SIM_ACCOUNT = Account(
+    name=DEFAULT_ACCOUNT,
+    shioaji_api_key="",
+    shioaji_api_secret="",
+    ca_path="",
+    ca_password="",
+    ca_person_id="",
+)
+"""Logs in to the simulated broker, so the benchmark runs without the bot's settings."""
+
+
+def default(name: str) -> Any:
+    """Return the default of a setting without loading `CONFIG`, which needs bot secrets."""
+    return Config.model_fields[name].default
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(name: str, latencies: Sequence[float], elapsed: float) -> dict[str, Any]:
+    return {
+        "name": name,
+        "count": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+class _NoopResponse:
+    async def edit_message(self, **_: Any) -> None:
+        pass
+
+
+class _NoopInteraction:
+    """Accepts the responses of a view callback without a Discord connection."""
+
+    response = _NoopResponse()
+
+
+async def repeat(
+    times: int, func: Callable[[], Awaitable[Any] | None]
+) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    started_at = time.perf_counter()
+    for _ in range(times):
+        start = time.perf_counter()
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - started_at
+
+
+async def bench_login(api: SimShioaji, times: int) -> dict[str, Any]:
+    async def login() -> None:
+        await SimShioaji(
+            market=api.market,
+            simulation=True,
+            catalog=api.catalog,
+            account=api.account,
+            executor=api.executor,
+        ).connect(fetch_contract=False)
+
+    return summarize("login", *await repeat(times, login))
+
+
+async def bench_placement(api: SimShioaji, args: argparse.Namespace) -> dict[str, Any]:
+    codes = [str(1000 + i) for i in range(min(args.orders, args.contracts))]
+    orders = [Order(stock_id=code, price=100.0, quantity=1) for code in codes]
+    prepared = [p for o in orders if (p := prepare_order(api, o)) is not None]
+
+    engine = PlacementEngine(
+        workers=args.workers,
+        rate_limit=args.engine_rate,
+        retry_on=(*TRANSIENT_ERRORS, SimBrokerError),
+    )
+    started_at = time.perf_counter()
+    results = await engine.run(api, prepared)
+    elapsed = time.perf_counter() - started_at
+
+    summary = summarize("place_orders", [r.latency for r in results], elapsed)
+    summary["failed"] = sum(r.error is not None for r in results)
+    return summary
+
+
+async def bench_list_trades(api: SimShioaji, times: int) -> dict[str, Any]:
+    book = TradeBook()
+
+    async def reconcile() -> None:
+        await api.update_status()
+        book.replace(await api.list_trades())
+
+    return summarize("list_trades", *await repeat(times, reconcile))
+
+
+async def bench_render(
+    api: SimShioaji, catalog: ContractCatalog, args: argparse.Namespace
+) -> dict[str, Any]:
+    # Serve the order book from the in-memory cache instead of Postgres
+    for i in range(args.contracts):
+        ORDER_CACHE.put(Order(stock_id=str(1000 + i), price=100.0, quantity=1))
+    ORDER_CACHE.loaded = True
+    book = TradeBook()
+    book.replace(await api.list_trades())
+    options = {"timeout": default("view_timeout"), "max_open_views": default("max_open_views")}
+
+    async def render() -> None:
+        for view in (
+            OrderManageView(catalog, DEFAULT_ACCOUNT, **options),
+            TradeManageView(book, catalog, DEFAULT_ACCOUNT, **options),
+        ):
+            await view.load()
+            view.render()
+            # Page forward, then back onto pages that are already cached
+            for button in (view.next_page, view.next_page, view.previous_page):
+                if not button.disabled:
+                    await button.callback(_NoopInteraction())  # pyright: ignore[reportArgumentType]
+
+    return summarize("render_views", *await repeat(args.repeat, render))
+
+
+async def bench_ticks(api: SimShioaji, args: argparse.Namespace) -> dict[str, Any]:
+    codes = [str(1000 + i) for i in range(min(args.watched, args.contracts))]
+    index = TriggerIndex()
+    for i in range(args.triggers):
+        index.add(codes[i % len(codes)], api.market.random.uniform(85.0, 100.0), i)
+
+    latencies: list[float] = []
+
+    def on_tick(_: Any, tick: Any) -> None:
+        start = time.perf_counter()
+        index.fire(tick.code, float(tick.close))
+        latencies.append(time.perf_counter() - start)
+
+    api.set_tick_callback(on_tick)
+    api.quote.codes.update(codes)
+    replay = TickReplay.random_walk(api.market, codes, count=args.ticks)
+    started_at = time.perf_counter()
+    await asyncio.to_thread(replay.play)
+    elapsed = time.perf_counter() - started_at
+
+    summary = summarize("trigger_ticks", latencies, elapsed)
+    summary["fired"] = args.triggers - len(index)
+    return summary
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    market = SimMarket(
+        contracts=args.contracts,
+        trades=args.trades,
+        latency=args.latency,
+        jitter=args.jitter,
+        login_latency=args.login_latency,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = ContractCatalog(Path(tmp) / "contracts.bin")
+        catalog.write_stocks(market.stocks)
+
+        executor = PriorityExecutor(args.shioaji_workers, name="shioaji")
+        api = SimShioaji(
+            market=market, simulation=True, catalog=catalog, account=SIM_ACCOUNT, executor=executor
+        )
+        await api.connect(fetch_contract=False)
+
+        results = [
+            await bench_login(api, args.logins),
+            await bench_placement(api, args),
+            await bench_list_trades(api, args.repeat),
+            await bench_render(api, catalog, args),
+            await bench_ticks(api, args),
+        ]
+        catalog.close()
+        executor.shutdown()
+    return results
+
+
+def compare(results: list[dict[str, Any]], baseline_path: Path, tolerance: float) -> list[str]:
+    """Return a description of every scenario that regressed past `tolerance`."""
+    baseline = {r["name"]: r for r in json.loads(baseline_path.read_text(encoding="utf-8"))}
+    regressions: list[str] = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if base is None:
+            continue
+        if r["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{r['name']}: throughput {r['throughput']:.1f}/s < {base['throughput']:.1f}/s"
+            )
+        if r["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{r['name']}: p99 {r['p99_ms']:.1f}ms > {base['p99_ms']:.1f}ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contracts", type=int, default=5000)
+    parser.add_argument("--trades", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--login-latency", type=float, default=0.5)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=default("order_workers"))
+    parser.add_argument("--engine-rate", type=float, default=default("order_rate_limit"))
+    parser.add_argument("--watched", type=int, default=default("max_watched_symbols"))
+    parser.add_argument("--shioaji-workers", type=int, default=default("shioaji_workers"))
+    parser.add_argument("--triggers", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=100000)
+    parser.add_argument("--logins", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Write the results to this file")
+    parser.add_argument("--compare", type=Path, help="Fail on regressions against this file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print(f"{'scenario':<14}{'count':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(
+            f"{r['name']:<14}{r['count']:>8}{r['throughput']:>12.1f}"
+            f"{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+        )
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
+import io
+import time
+from pathlib import PurePath
 from typing import TYPE_CHECKING, Any
 
-import shioaji.constant as sjc
-from discord.ext import commands, tasks
-from loguru import logger
+import discord
+from discord.ext import commands
 
 from bot.config import CONFIG
+from bot.constants import UTC8
 from bot.db.models.order import Order
-from bot.shioaji import AsyncShioaji
+from bot.db.models.trade_event import TradeEvent
+from bot.db.models.trigger import TriggerKind
+from bot.order_io import dump_orders, parse_orders
 from bot.ui.main import MainView
+from bot.watchdog import WATCHDOG
 
 if TYPE_CHECKING:
     from bot.main import Bot
@@ -20,72 +27,6 @@ class PlaceOrderCog(commands.Cog):
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
 
-    async def cog_load(self) -> None:
-        self.place_orders.start()
-
-    async def cog_unload(self) -> None:
-        self.place_orders.cancel()
-
-    async def _place_order(self, api: AsyncShioaji, *, order: Order) -> None:
-        contract = api.get_stock(order.stock_id)
-        if contract is None:
-            logger.warning(f"Contract {order.stock_id} not found")
-            return
-
-        order_obj = api.Order(
-            price=order.price,
-            quantity=order.quantity,
-            action=sjc.Action.Buy,
-            price_type=sjc.StockPriceType.LMT,
-            order_type=sjc.OrderType.ROD,
-            account=api.stock_account,
-        )
-        trade = await api.place_order(contract, order_obj)
-        logger.info(f"Placed order: {trade}")
-
-    @tasks.loop(
-        time=datetime.time(hour=8, minute=30, tzinfo=datetime.timezone(datetime.timedelta(hours=8)))
-    )
-    async def place_orders(self) -> None:
-        logger.info("Place orders task started")
-
-        async with AsyncShioaji() as api:
-            if not CONFIG.simulation:
-                positions = await api.list_positions()
-                position_ids = {p.code for p in positions}
-            else:
-                position_ids = {}
-            logger.info(f"Position IDs: {position_ids}")
-
-            await api.update_status()
-            trades = await api.list_trades()
-
-            trades = [t for t in trades if t.status.status == sjc.Status.PreSubmitted]
-            trade_stocks_ids = {t.contract.code for t in trades}
-
-            orders = await Order.all()
-            for o in orders:
-                logger.info(f"Processing order: {o}")
-
-                if o.stock_id in trade_stocks_ids:
-                    logger.info(
-                        f"Order {o.stock_id} already in pre-submitted trades, skipping order"
-                    )
-                    continue
-
-                if o.stock_id in position_ids:
-                    logger.info(
-                        f"Order {o.stock_id} already in positions, skipping and deleting order"
-                    )
-                    await o.delete()
-                    continue
-
-                await self._place_order(api, order=o)
-
-    @place_orders.before_loop
-    async def before_place_orders(self) -> None:
-        await self.bot.wait_until_ready()
-
     @commands.is_owner()
     @commands.command(name="view")
     async def view(self, ctx: commands.Context) -> Any:
@@ -95,8 +36,165 @@ class PlaceOrderCog(commands.Cog):
     @commands.command(name="task")
     async def task(self, ctx: commands.Context) -> Any:
         message = await ctx.send("Place orders task started")
-        await self.place_orders()
-        await message.edit(content="Place orders task finished")
+        placed = await (await self.bot.get_trader()).place_now()
+        await message.edit(content=f"Place orders task finished, placed {placed} orders")
+
+    @commands.is_owner()
+    @commands.command(name="trigger")
+    async def trigger(
+        self, ctx: commands.Context, stock_id: str, price: float, quantity: int, threshold: str
+    ) -> Any:
+        """Buy `quantity` at `price` once a tick prints at or below `threshold`.
+
+        A threshold such as `5%` fires once the price drops 5 percent below the reference.
+        """
+        account = CONFIG.account_for(ctx.author.id)
+        if account is None:
+            await ctx.send("You are not bound to any account")
+            return
+
+        if threshold.endswith("%"):
+            kind, value = TriggerKind.DROP, float(threshold.removesuffix("%"))
+        else:
+            kind, value = TriggerKind.PRICE, float(threshold)
+
+        trigger = await (await self.bot.get_trader()).create_trigger(
+            account=account.name,
+            stock_id=stock_id,
+            price=price,
+            quantity=quantity,
+            kind=kind,
+            threshold=value,
+        )
+        if trigger is None:
+            await ctx.send(f"Stock {stock_id} not found")
+            return
+
+        await ctx.send(f"Trigger {trigger.id} armed: buy {quantity} {stock_id} at {price}")
+
+    @commands.is_owner()
+    @commands.command(name="import")
+    async def import_orders(self, ctx: commands.Context, mode: str = "merge") -> Any:
+        """Load the orders of an attached `.csv`, `.jsonl` or `.json` file in one transaction.
+
+        Existing orders of the same stocks are overwritten. With mode `replace`, the
+        account's orders that are not in the file are deleted as well.
+        """
+        account = CONFIG.account_for(ctx.author.id)
+        if account is None:
+            await ctx.send("You are not bound to any account")
+            return
+        if not ctx.message.attachments or mode not in {"merge", "replace"}:
+            await ctx.send("Attach a .csv, .jsonl or .json file, mode is merge or replace")
+            return
+
+        attachment = ctx.message.attachments[0]
+        catalog = await (await self.bot.get_trader()).get_catalog()
+        fmt = PurePath(attachment.filename).suffix.removeprefix(".").lower()
+        # Parsing a large file takes long enough to stall the gateway heartbeat
+        parsed = await asyncio.to_thread(parse_orders, await attachment.read(), fmt, catalog)
+        if parsed.errors:
+            # All or nothing, a partial import with replace would delete orders by mistake
+            errors = "\n".join(parsed.errors)
+            await ctx.send(f"No orders imported, fix these rows first:\n```\n{errors[:1800]}\n```")
+            return
+
+        started = time.perf_counter()
+        written, deleted = await Order.import_many(
+            account.name, parsed.rows, replace=mode == "replace"
+        )
+        elapsed = time.perf_counter() - started
+        await ctx.send(
+            f"Imported {written} orders into {account.name!r} and deleted {deleted} "
+            f"in {elapsed:.2f}s"
+        )
+
+    @commands.is_owner()
+    @commands.command(name="export")
+    async def export_orders(self, ctx: commands.Context, fmt: str = "csv") -> Any:
+        """Send the account's orders as a `csv` or `jsonl` file that `!import` reads back."""
+        account = CONFIG.account_for(ctx.author.id)
+        if account is None:
+            await ctx.send("You are not bound to any account")
+            return
+        if fmt not in {"csv", "jsonl"}:
+            await ctx.send("Format is csv or jsonl")
+            return
+
+        orders = sorted(await Order.all(account.name), key=lambda o: o.stock_id)
+        data = io.BytesIO()
+        for chunk in dump_orders(orders, fmt):
+            data.write(chunk.encode())
+        data.seek(0)
+        await ctx.send(
+            f"{len(orders)} orders of {account.name!r}",
+            file=discord.File(data, filename=f"orders-{account.name}.{fmt}"),
+        )
+
+    @commands.is_owner()
+    @commands.command(name="report")
+    async def report(
+        self, ctx: commands.Context, days: int = 30, stock_id: str | None = None
+    ) -> Any:
+        """Summarize the fills of the last `days` trading days, with the latest events of a stock."""
+        account = CONFIG.account_for(ctx.author.id)
+        if account is None:
+            await ctx.send("You are not bound to any account")
+            return
+
+        since = datetime.datetime.now(UTC8).date() - datetime.timedelta(days=days)
+        started = time.perf_counter()
+        summaries = await TradeEvent.fill_report(account.name, since=since, stock_id=stock_id)
+        events = (
+            await TradeEvent.history(account.name, since=since, stock_id=stock_id)
+            if stock_id is not None
+            else []
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+
+        lines = [
+            f"{'stock':<6} {'filled':>6} {'avg':>8} {'deals':>5} {'placed':>6} {'cxl':>4} {'fail':>4}"
+        ]
+        lines.extend(
+            f"{s.stock_id:<6} {s.filled:>6} "
+            f"{f'{s.average_price:.2f}' if s.average_price is not None else '-':>8} "
+            f"{s.deals:>5} {s.placed:>6} {s.cancelled:>4} {s.failed:>4}"
+            for s in summaries
+        )
+        lines.extend(
+            f"{e.occurred_at.astimezone(UTC8):%m-%d %H:%M:%S} {e.kind:<9} "
+            f"{e.quantity} @ {e.price if e.price is not None else '-'} {e.trade_id or ''}"
+            for e in events
+        )
+        body = "\n".join(lines)[:1900]
+        await ctx.send(
+            f"Trade events of {account.name!r} since {since} ({elapsed:.0f} ms)\n```\n{body}\n```"
+        )
+
+    @commands.is_owner()
+    @commands.command(name="lag")
+    async def lag(self, ctx: commands.Context) -> Any:
+        """Show the recent event loop lag of the bot and the latest blocking stack."""
+        summary = WATCHDOG.summary()
+        if summary is None:
+            await ctx.send("No event loop lag measured yet")
+            return
+
+        lines = [
+            (
+                f"Event loop lag over {summary.samples} samples: p50 {summary.p50 * 1000:.1f}ms, "
+                f"p90 {summary.p90 * 1000:.1f}ms, p99 {summary.p99 * 1000:.1f}ms, "
+                f"max {summary.max * 1000:.1f}ms, {len(WATCHDOG.stalls)} recent stalls"
+            )
+        ]
+        if WATCHDOG.stalls:
+            stall = WATCHDOG.stalls[-1]
+            # The innermost frames are the interesting ones
+            stack = stall.stack[-1500:]
+            lines.append(
+                f"Blocked {stall.seconds:.3f}s at {stall.at:%m-%d %H:%M:%S}:\n```\n{stack}\n```"
+            )
+        await ctx.send("\n".join(lines))
 
 
 async def setup(bot: Bot) -> None:
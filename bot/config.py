@@ -1,22 +1,160 @@
 from __future__ import annotations
 
+import datetime
+import functools
+from typing import Any
+
+import pydantic
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
+DEFAULT_ACCOUNT = "default"
+"""Name of the account built from the top-level credentials when `accounts` is empty."""
 
-class Config(BaseSettings):
-    discord_token: str
-    db_url: str
 
+class Account(pydantic.BaseModel):
+    """A Sinopac account and the Discord users whose orders it places."""
+
+    name: str
     shioaji_api_key: str
     shioaji_api_secret: str
-
     ca_path: str
     ca_password: str
     ca_person_id: str
 
+    user_ids: list[int] = []
+    """Discord users bound to this account, empty to serve everyone who is not bound elsewhere."""
+    order_rate_limit: float | None = None
+    """Orders submitted per second for this account, `Config.order_rate_limit` if None."""
+
+
+class Config(BaseSettings):
+    discord_token: str
+    db_url: str
+
+    shioaji_api_key: str = ""
+    shioaji_api_secret: str = ""
+
+    ca_path: str = ""
+    ca_password: str = ""
+    ca_person_id: str = ""
+
+    accounts: list[Account] = []
+    """Accounts served by one deployment, as JSON, e.g. `ACCOUNTS='[{"name": "alice", ...}]'`.
+
+    When empty, a single `default` account uses the credentials above.
+    """
+
     simulation: bool = True
+    sim_broker: bool = False
+    """Trade against the offline broker simulator in `bot.sim` instead of Sinopac."""
+
+    contract_catalog_path: str = "cache/contracts.bin"
+
+    place_times: list[datetime.time] = [datetime.time(8, 30)]
+    """Times in UTC+8 when long-term orders are sent to the broker on trading days.
+
+    Every run sends regular session ROD limit orders, so later times only retry orders
+    that were added or failed earlier in the day and should fall before the close at 13:30.
+    """
+    prepare_lead: float = 300
+    """Seconds before each place time to login, snapshot the account and build the orders."""
+    trading_calendar_path: str = "bot/data/twse_holidays.csv"
+
+    order_workers: int = 8
+    order_rate_limit: float = 25
+    """Maximum number of orders submitted per second."""
+
+    quotes_ttl: float = 5
+    """Seconds a fetched last price is shown for before asking the broker again."""
+    positions_ttl: float = 30
+    """Seconds a fetched list of positions is reused for."""
+    trades_ttl: float = 10
+    """Seconds a reconciled trade book is reused for before asking the broker again."""
+
+    view_timeout: float = 900
+    """Seconds of inactivity after which an order or trade list stops responding."""
+    max_open_views: int = 50
+    """Order and trade lists kept open at once, the least recently used are closed first."""
+
+    max_watched_symbols: int = 200
+    """Stocks whose ticks are subscribed to for price triggers, within the broker's quota."""
+
+    event_flush_interval: float = 1
+    """Seconds between writes of buffered trade events to the database."""
+    event_batch_size: int = 1000
+    """Buffered trade events that trigger a write before `event_flush_interval` passes."""
+    max_buffered_events: int = 100_000
+    """Trade events kept while the database is unreachable, the oldest are dropped first."""
+
+    loop_lag_interval: float = 0.1
+    """Seconds between event loop lag measurements."""
+    loop_lag_threshold: float = 0.25
+    """Seconds the event loop may be blocked before the blocking stack is logged."""
+
+    engine_socket: str | None = None
+    """Unix socket of a trading engine started with `run_engine.py`.
+
+    When set, the bot forwards trading commands to that process instead of owning the
+    broker session and the placement schedule itself.
+    """
+
+    shioaji_workers: int = 8
+    """Threads dedicated to blocking shioaji calls."""
+    broker_connect_attempts: int = 3
+    """Logins tried for a caller that needs the broker before it gives up.
+
+    The background health check keeps retrying until the broker is back.
+    """
+    broker_connect_timeout: float = 30
+    """Seconds a caller waits for a login already in progress before it gives up."""
+
+    log_enqueue: bool = True
+    """Write log messages from a background thread instead of the logging call."""
+    log_json: bool = False
+    """Write the log file as JSON lines, one serialized record per line."""
+
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int | None = 9464
+    """Port to serve Prometheus metrics on, None to disable."""
+    engine_metrics_port: int | None = 9465
+    """Metrics port of the trading engine process, None to disable."""
+
+    def all_accounts(self) -> list[Account]:
+        if self.accounts:
+            return self.accounts
+        return [
+            Account(
+                name=DEFAULT_ACCOUNT,
+                shioaji_api_key=self.shioaji_api_key,
+                shioaji_api_secret=self.shioaji_api_secret,
+                ca_path=self.ca_path,
+                ca_password=self.ca_password,
+                ca_person_id=self.ca_person_id,
+            )
+        ]
+
+    def account_for(self, user_id: int) -> Account | None:
+        """Return the account a Discord user manages orders of, None if there is none."""
+        accounts = self.all_accounts()
+        bound = next((a for a in accounts if user_id in a.user_ids), None)
+        return bound or next((a for a in accounts if not a.user_ids), None)
+
+
+@functools.cache
+def get_config() -> Config:
+    load_dotenv()
+    return Config()  # pyright: ignore[reportCallIssue]
+
+
+class _LazyConfig:
+    """Builds `Config` on first attribute access instead of when `bot.config` is imported."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_config(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_config(), name, value)
 
 
-load_dotenv()
-CONFIG = Config()  # pyright: ignore[reportCallIssue]
+CONFIG: Config = _LazyConfig()  # pyright: ignore[reportAssignmentType]
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import enum
+import mmap
+import struct
+import uuid
+from array import array
+from typing import TYPE_CHECKING, NamedTuple
+
+from loguru import logger
+
+from bot.constants import UTC8
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+    from shioaji.contracts import Contract, StreamStockContracts
+
+CATALOG_VERSION = 2
+"""Bump this whenever the file layout changes, old files are rebuilt on load."""
+
+REFRESH_TIME = datetime.time(7, 50, tzinfo=UTC8)
+"""Shioaji publishes the day's limit prices before this time."""
+
+_MAGIC = b"LTOC"
+_HEADER = struct.Struct("<4sHIqI")  # magic, version, count, built_at, names size
+_CODE_SIZE = 8
+_EXCHANGES = ("TSE", "OTC", "OES")
+_ETF_CATEGORY = "00"
+"""Industry category the broker gives exchange-traded funds."""
+
+
+class SecurityCategory(enum.StrEnum):
+    """Kind of security, which decides the tick ladder its prices are on."""
+
+    UNKNOWN = "unknown"
+    """Warrants, ETNs and anything else whose tick ladder is not known."""
+    STOCK = "stock"
+    ETF = "etf"
+
+
+_CATEGORIES = tuple(SecurityCategory)
+
+
+def classify(contract: Contract) -> SecurityCategory:
+    """Return the category of a broker contract, UNKNOWN unless it is clearly a stock or ETF."""
+    category = getattr(contract, "category", "")
+    if category == _ETF_CATEGORY:
+        return SecurityCategory.ETF
+    # Common stocks have four digit codes, six digit codes are warrants and similar
+    if category and len(contract.code) == 4 and contract.code.isdigit():
+        return SecurityCategory.STOCK
+    return SecurityCategory.UNKNOWN
+
+
+class CatalogEntry(NamedTuple):
+    code: str
+    name: str
+    exchange: str
+    limit_up: float
+    limit_down: float
+    reference: float
+    unit: int
+    category: SecurityCategory
+
+
+class _Columns:
+    """Column views over a memory-mapped catalog file."""
+
+    def __init__(self, buffer: mmap.mmap) -> None:
+        magic, version, count, built_at, names_size = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC or version != CATALOG_VERSION:
+            msg = f"Unsupported catalog file (magic={magic!r}, version={version})"
+            raise ValueError(msg)
+
+        self.buffer = buffer
+        self.count = count
+        self.built_at = datetime.datetime.fromtimestamp(built_at, UTC8)
+
+        view = memoryview(buffer)
+        offset = _HEADER.size
+        self.codes = view[offset : offset + count * _CODE_SIZE]
+        offset += count * _CODE_SIZE
+        self.exchanges = view[offset : offset + count]
+        offset += count
+        self.categories = view[offset : offset + count]
+        offset += count
+        self.units = view[offset : offset + count * 4].cast("I")
+        offset += count * 4
+        self.limit_ups = view[offset : offset + count * 8].cast("d")
+        offset += count * 8
+        self.limit_downs = view[offset : offset + count * 8].cast("d")
+        offset += count * 8
+        self.references = view[offset : offset + count * 8].cast("d")
+        offset += count * 8
+        self.name_offsets = view[offset : offset + (count + 1) * 4].cast("I")
+        offset += (count + 1) * 4
+        self.names = view[offset : offset + names_size]
+
+    def code(self, index: int) -> bytes:
+        start = index * _CODE_SIZE
+        return bytes(self.codes[start : start + _CODE_SIZE]).rstrip(b"\0")
+
+    def find(self, code: str) -> int | None:
+        key = code.encode()
+        index = bisect.bisect_left(range(self.count), key, key=self.code)
+        if index < self.count and self.code(index) == key:
+            return index
+        return None
+
+    def name(self, index: int) -> str:
+        return bytes(self.names[self.name_offsets[index] : self.name_offsets[index + 1]]).decode()
+
+    def entry(self, index: int) -> CatalogEntry:
+        return CatalogEntry(
+            code=self.code(index).decode(),
+            name=self.name(index),
+            exchange=_EXCHANGES[self.exchanges[index]],
+            limit_up=self.limit_ups[index],
+            limit_down=self.limit_downs[index],
+            reference=self.references[index],
+            unit=self.units[index],
+            category=_CATEGORIES[self.categories[index]],
+        )
+
+    def release(self) -> None:
+        for column in (
+            self.codes,
+            self.exchanges,
+            self.categories,
+            self.units,
+            self.limit_ups,
+            self.limit_downs,
+            self.references,
+            self.name_offsets,
+            self.names,
+        ):
+            column.release()
+        self.buffer.close()
+
+
+class ContractCatalog:
+    """A persistent, versioned catalog of stock contracts.
+
+    The catalog is a single columnar file with codes sorted for binary search. It is
+    memory-mapped on first access and rebuilt from the broker's contracts once per
+    trading day, so lookups never need a broker round trip.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._columns: _Columns | None = None
+        self._loaded = False
+
+    def _load(self) -> _Columns | None:
+        if self._loaded:
+            return self._columns
+
+        self._loaded = True
+        if not self.path.exists():
+            return None
+
+        with self.path.open("rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                logger.warning(f"Ignoring empty contract catalog at {self.path}")
+                return None
+        try:
+            self._columns = _Columns(buffer)
+        except (ValueError, struct.error):
+            buffer.close()
+            logger.warning(f"Ignoring outdated contract catalog at {self.path}")
+            return None
+
+        logger.info(
+            f"Loaded {self._columns.count} contracts from catalog built at {self._columns.built_at}"
+        )
+        return self._columns
+
+    @property
+    def exists(self) -> bool:
+        return self._load() is not None
+
+    @property
+    def built_at(self) -> datetime.datetime | None:
+        columns = self._load()
+        return columns.built_at if columns is not None else None
+
+    def is_fresh(self, now: datetime.datetime | None = None) -> bool:
+        """Return whether the catalog was built after the latest daily contract update."""
+        built_at = self.built_at
+        if built_at is None:
+            return False
+
+        now = now or datetime.datetime.now(UTC8)
+        boundary = datetime.datetime.combine(now.date(), REFRESH_TIME)
+        if now < boundary:
+            boundary -= datetime.timedelta(days=1)
+        return built_at >= boundary
+
+    def get(self, code: str) -> CatalogEntry | None:
+        columns = self._load()
+        if columns is None:
+            return None
+
+        index = columns.find(code)
+        return columns.entry(index) if index is not None else None
+
+    def name(self, code: str) -> str | None:
+        """Return the name of a stock, without decoding the rest of its entry."""
+        columns = self._load()
+        if columns is None:
+            return None
+
+        index = columns.find(code)
+        return columns.name(index) if index is not None else None
+
+    def category(self, code: str) -> SecurityCategory | None:
+        """Return the category of a stock, None if it is not in the catalog."""
+        columns = self._load()
+        if columns is None:
+            return None
+
+        index = columns.find(code)
+        return _CATEGORIES[columns.categories[index]] if index is not None else None
+
+    def limits(self, code: str) -> tuple[float, float] | None:
+        """Return today's limit-down and limit-up prices of a stock."""
+        columns = self._load()
+        if columns is None:
+            return None
+
+        index = columns.find(code)
+        if index is None:
+            return None
+        return columns.limit_downs[index], columns.limit_ups[index]
+
+    def __len__(self) -> int:
+        columns = self._load()
+        return columns.count if columns is not None else 0
+
+    def __contains__(self, code: str) -> bool:
+        columns = self._load()
+        return columns is not None and columns.find(code) is not None
+
+    def write(self, contracts: Iterable[Contract]) -> None:
+        """Write a new catalog file from contracts.
+
+        The file is replaced atomically, call `reload` afterwards to switch lookups over.
+        """
+        entries = {
+            c.code: c
+            for c in contracts
+            if c.exchange.value in _EXCHANGES and len(c.code.encode()) <= _CODE_SIZE
+        }
+        codes = sorted(entries)
+
+        names = bytearray()
+        name_offsets = array("I", [0])
+        for code in codes:
+            names += entries[code].name.encode()
+            name_offsets.append(len(names))
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Sessions of several accounts may rebuild the catalog at the same time
+        tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        with tmp_path.open("wb") as f:
+            f.write(
+                _HEADER.pack(
+                    _MAGIC,
+                    CATALOG_VERSION,
+                    len(codes),
+                    int(datetime.datetime.now(UTC8).timestamp()),
+                    len(names),
+                )
+            )
+            f.write(b"".join(code.encode().ljust(_CODE_SIZE, b"\0") for code in codes))
+            f.write(bytes(_EXCHANGES.index(entries[code].exchange.value) for code in codes))
+            f.write(bytes(_CATEGORIES.index(classify(entries[code])) for code in codes))
+            f.write(array("I", (entries[code].unit for code in codes)).tobytes())
+            for field in ("limit_up", "limit_down", "reference"):
+                f.write(array("d", (getattr(entries[code], field) for code in codes)).tobytes())
+            f.write(name_offsets.tobytes())
+            f.write(names)
+
+        tmp_path.replace(self.path)
+        logger.info(f"Built contract catalog with {len(codes)} contracts at {self.path}")
+
+    def write_stocks(self, stocks: StreamStockContracts) -> None:
+        self.write(contract for market in stocks for contract in market)
+
+    def reload(self) -> None:
+        """Drop the current mapping so the next lookup maps the file again."""
+        self.close()
+
+    def close(self) -> None:
+        if self._columns is not None:
+            self._columns.release()
+        self._columns = None
+        self._loaded = False
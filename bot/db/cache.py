@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import itertools
+import json
+from typing import TYPE_CHECKING, Any
+
+import asyncpg
+import sqlmodel
+from loguru import logger
+
+from bot.db.session import asyncpg_dsn, get_db
+from bot.metrics import query
+
+if TYPE_CHECKING:
+    from bot.db.models.order import Order
+
+CHANNEL = "order_changed"
+"""Postgres channel the order table announces changes on, see `bot.db.migrations`."""
+
+
+class OrderCache:
+    """A write-through, in-memory copy of the order table keyed by account and stock ID.
+
+    The cache is loaded once at startup and updated by every write made through `Order`.
+    Changes made by other bot instances arrive through Postgres LISTEN/NOTIFY.
+    """
+
+    def __init__(self, model: type[Order]) -> None:
+        self.model = model
+        self._orders: dict[tuple[str, str], Order] = {}
+        self._keys: list[tuple[str, str]] = []
+        self.version = 0
+        """Incremented on every change, for invalidating derived views."""
+        self._conn: asyncpg.Connection | None = None
+        self._reconnect_task: asyncio.Task[None] | None = None
+        self._closing = False
+        self.loaded = False
+
+    def get(self, account: str, stock_id: str) -> Order | None:
+        return self._orders.get((account, stock_id))
+
+    def all(self, account: str | None = None) -> list[Order]:
+        if account is None:
+            return list(self._orders.values())
+        return [o for o in self._orders.values() if o.account == account]
+
+    def page(
+        self, account: str, *, after: str | None = None, prefix: str = "", limit: int = 25
+    ) -> list[Order]:
+        """Return up to `limit` orders of an account ordered by stock ID, see `Order.page`."""
+        start = bisect.bisect_right(self._keys, (account, after)) if after is not None else 0
+        start = max(start, bisect.bisect_left(self._keys, (account, prefix)))
+        orders: list[Order] = []
+        for key in itertools.islice(self._keys, start, None):
+            if key[0] != account or not key[1].startswith(prefix) or len(orders) >= limit:
+                break
+            orders.append(self._orders[key])
+        return orders
+
+    def put(self, order: Order) -> None:
+        key = (order.account, order.stock_id)
+        if key not in self._orders:
+            bisect.insort(self._keys, key)
+        self._orders[key] = order
+        self.version += 1
+
+    def discard(self, account: str, stock_id: str) -> None:
+        key = (account, stock_id)
+        if self._orders.pop(key, None) is None:
+            return
+
+        del self._keys[bisect.bisect_left(self._keys, key)]
+        self.version += 1
+
+    @query("order_cache.load")
+    async def load(self) -> None:
+        async with get_db() as db:
+            orders = (await db.exec(sqlmodel.select(self.model))).all()
+
+        self._orders = {(o.account, o.stock_id): o for o in orders}
+        self._keys = sorted(self._orders)
+        self.version += 1
+        self.loaded = True
+        logger.info(f"Loaded {len(self._orders)} orders into cache")
+
+    def _on_notify(self, _conn: Any, _pid: int, _channel: str, payload: str) -> None:
+        event = json.loads(payload)
+        if event["op"] == "DELETE":
+            self.discard(event["row"]["account"], event["row"]["stock_id"])
+        else:
+            self.put(self.model.model_validate(event["row"]))
+
+    def _on_terminate(self, _conn: Any) -> None:
+        if self._closing:
+            return
+
+        logger.warning("Order cache listener disconnected, reconnecting")
+        self._conn = None
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 1.0
+        while not self._closing:
+            try:
+                await self.listen()
+                # Changes may have been missed while disconnected
+                await self.load()
+            except Exception:
+                logger.exception(f"Failed to reconnect order cache, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+            else:
+                return
+
+    async def listen(self) -> None:
+        self._conn = await asyncpg.connect(asyncpg_dsn())
+        self._conn.add_termination_listener(self._on_terminate)
+        await self._conn.add_listener(CHANNEL, self._on_notify)
+
+    async def start(self) -> None:
+        await self.listen()
+        await self.load()
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from loguru import logger
+from sqlalchemy import text
+
+from bot.config import DEFAULT_ACCOUNT
+from bot.db.cache import CHANNEL
+from bot.db.session import get_engine
+
+LOCK_KEY = 0x6C6F6E67
+"""Postgres advisory lock held while migrating, the bot and the engine may start together."""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+
+# Never edit a migration that has been released, append a new one instead.
+MIGRATIONS = (
+    Migration(
+        1,
+        "create order table",
+        (
+            # IF NOT EXISTS adopts databases that were set up by SQLModel.metadata.create_all
+            """
+            CREATE TABLE IF NOT EXISTS "order" (
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+                stock_id VARCHAR NOT NULL,
+                price FLOAT NOT NULL,
+                quantity INTEGER NOT NULL,
+                PRIMARY KEY (stock_id)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "notify order changes",
+        (
+            f"""
+            CREATE OR REPLACE FUNCTION notify_order_changed() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify('{CHANNEL}', json_build_object('op', TG_OP, 'row', row_to_json(OLD))::text);
+                ELSE
+                    PERFORM pg_notify('{CHANNEL}', json_build_object('op', TG_OP, 'row', row_to_json(NEW))::text);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            'DROP TRIGGER IF EXISTS order_changed ON "order"',
+            """
+            CREATE TRIGGER order_changed AFTER INSERT OR UPDATE OR DELETE ON "order"
+            FOR EACH ROW EXECUTE FUNCTION notify_order_changed()
+            """,
+        ),
+    ),
+    Migration(
+        3,
+        "create placement journal",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS placement (
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+                stock_id VARCHAR NOT NULL,
+                trading_date DATE NOT NULL,
+                status VARCHAR NOT NULL,
+                trade_id VARCHAR,
+                attempts INTEGER NOT NULL,
+                error VARCHAR,
+                PRIMARY KEY (stock_id, trading_date)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        4,
+        "create price triggers",
+        (
+            """
+            CREATE TABLE "trigger" (
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+                id SERIAL PRIMARY KEY,
+                stock_id VARCHAR NOT NULL,
+                price FLOAT NOT NULL,
+                quantity INTEGER NOT NULL,
+                kind VARCHAR NOT NULL,
+                threshold FLOAT NOT NULL,
+                fired_at TIMESTAMP WITH TIME ZONE,
+                trade_id VARCHAR
+            )
+            """,
+            'CREATE INDEX ix_trigger_stock_id ON "trigger" (stock_id)',
+        ),
+    ),
+    Migration(
+        5,
+        "scope orders to accounts",
+        (
+            f"""ALTER TABLE "order" ADD COLUMN account VARCHAR NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'""",
+            'ALTER TABLE "order" DROP CONSTRAINT order_pkey',
+            'ALTER TABLE "order" ADD PRIMARY KEY (account, stock_id)',
+            f"""ALTER TABLE placement ADD COLUMN account VARCHAR NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'""",
+            "ALTER TABLE placement DROP CONSTRAINT placement_pkey",
+            "ALTER TABLE placement ADD PRIMARY KEY (account, stock_id, trading_date)",
+            f"""ALTER TABLE "trigger" ADD COLUMN account VARCHAR NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'""",
+        ),
+    ),
+    Migration(
+        6,
+        "create trade event log",
+        (
+            """
+            CREATE TABLE trade_event (
+                id BIGSERIAL PRIMARY KEY,
+                account VARCHAR NOT NULL,
+                trading_date DATE NOT NULL,
+                stock_id VARCHAR NOT NULL,
+                trade_id VARCHAR,
+                kind VARCHAR NOT NULL,
+                price FLOAT,
+                quantity INTEGER NOT NULL,
+                occurred_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                detail VARCHAR
+            )
+            """,
+            # Reports filter by account and a range of trading dates, optionally one stock
+            "CREATE INDEX ix_trade_event_date ON trade_event (account, trading_date, stock_id)",
+            "CREATE INDEX ix_trade_event_stock ON trade_event (account, stock_id, trading_date)",
+        ),
+    ),
+)
+
+
+async def migrate() -> None:
+    """Apply every migration newer than the database's schema version in one transaction."""
+    async with get_engine().begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        await conn.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR NOT NULL,
+                    applied_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+                )
+                """
+            )
+        )
+        result = await conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations"))
+        current = result.scalar_one()
+
+        pending = [m for m in MIGRATIONS if m.version > current]
+        for migration in pending:
+            logger.info(f"Applying migration {migration.version}: {migration.name}")
+            for statement in migration.statements:
+                await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": migration.version, "name": migration.name},
+            )
+
+    if pending:
+        logger.info(f"Migrated database from version {current} to {pending[-1].version}")
+    else:
+        logger.debug(f"Database is at version {current}")
@@ -3,50 +3,115 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import sqlmodel
+from sqlalchemy import String, any_, bindparam, delete, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 
+from bot.config import DEFAULT_ACCOUNT
+from bot.db.cache import OrderCache
 from bot.db.models.base import BaseModel
 from bot.db.session import get_db
+from bot.metrics import query
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Iterable, Sequence
     from types import EllipsisType
 
+    from bot.order_io import OrderRow
+
+UPSERT_CHUNK_SIZE = 5000
+"""Rows per INSERT statement, keeps the bind parameters under asyncpg's limit of 32767."""
+
 
 class Order(BaseModel, table=True):
+    account: str = sqlmodel.Field(default=DEFAULT_ACCOUNT, primary_key=True)
     stock_id: str = sqlmodel.Field(primary_key=True)
     price: float
     quantity: int
 
     @classmethod
-    async def get_or_none(cls, stock_id: str) -> Order | None:
+    @query("order.get_or_none")
+    async def get_or_none(cls, account: str, stock_id: str) -> Order | None:
+        if ORDER_CACHE.loaded:
+            return ORDER_CACHE.get(account, stock_id)
+
         async with get_db() as db:
-            order = await db.exec(sqlmodel.select(cls).where(cls.stock_id == stock_id))
+            order = await db.exec(
+                sqlmodel.select(cls).where(cls.account == account, cls.stock_id == stock_id)
+            )
 
         return order.first()
 
     @classmethod
-    async def create(cls, *, stock_id: str, price: float, quantity: int) -> Order:
-        order = cls(stock_id=stock_id, price=price, quantity=quantity)
+    @query("order.create")
+    async def create(cls, *, account: str, stock_id: str, price: float, quantity: int) -> Order:
+        order = cls(account=account, stock_id=stock_id, price=price, quantity=quantity)
         async with get_db() as db:
             db.add(order)
             await db.commit()
             await db.refresh(order)
 
+        ORDER_CACHE.put(order)
         return order
 
     @classmethod
-    async def all(cls) -> Sequence[Order]:
+    @query("order.all")
+    async def all(cls, account: str | None = None) -> Sequence[Order]:
+        """Return the orders of an account, or of every account if None."""
+        if ORDER_CACHE.loaded:
+            return ORDER_CACHE.all(account)
+
+        stmt = sqlmodel.select(cls)
+        if account is not None:
+            stmt = stmt.where(cls.account == account)
         async with get_db() as db:
-            orders = await db.exec(sqlmodel.select(cls))
+            orders = await db.exec(stmt)
 
         return orders.all()
 
     @classmethod
+    @query("order.page")
+    async def page(
+        cls, account: str, *, after: str | None = None, prefix: str = "", limit: int = 25
+    ) -> Sequence[Order]:
+        """Return up to `limit` orders of an account ordered by stock ID.
+
+        Args:
+            account: The account whose orders are returned.
+            after: The stock ID of the last order on the previous page.
+            prefix: Only return orders whose stock ID starts with this.
+            limit: Maximum number of orders to return.
+        """
+        if ORDER_CACHE.loaded:
+            return ORDER_CACHE.page(account, after=after, prefix=prefix, limit=limit)
+
+        stmt = (
+            sqlmodel.select(cls)
+            .where(cls.account == account)
+            .order_by(cls.stock_id)  # pyright: ignore[reportArgumentType]
+            .limit(limit)
+        )
+        if after is not None:
+            stmt = stmt.where(cls.stock_id > after)
+        if prefix:
+            stmt = stmt.where(sqlmodel.col(cls.stock_id).startswith(prefix, autoescape=True))
+
+        async with get_db() as db:
+            orders = await db.exec(stmt)
+
+        return orders.all()
+
+    @classmethod
+    @query("order.update")
     async def update(
-        cls, stock_id: str, *, price: float | EllipsisType = ..., quantity: int | EllipsisType = ...
+        cls,
+        account: str,
+        stock_id: str,
+        *,
+        price: float | EllipsisType = ...,
+        quantity: int | EllipsisType = ...,
     ) -> Order:
         async with get_db() as db:
-            order = await cls.get_or_none(stock_id)
+            order = await db.get(cls, (account, stock_id))
             if order is None:
                 msg = f"Order with stock_id {stock_id} not found"
                 raise ValueError(msg)
@@ -59,9 +124,144 @@ class Order(BaseModel, table=True):
             await db.commit()
             await db.refresh(order)
 
+        ORDER_CACHE.put(order)
+        return order
+
+    @classmethod
+    async def upsert(cls, *, account: str, stock_id: str, price: float, quantity: int) -> Order:
+        """Create the order or overwrite its price and quantity in a single statement."""
+        (order,) = await cls.upsert_many(
+            [cls(account=account, stock_id=stock_id, price=price, quantity=quantity)]
+        )
         return order
 
+    @classmethod
+    @query("order.upsert_many")
+    async def upsert_many(cls, orders: Sequence[Order]) -> list[Order]:
+        """Create or overwrite many orders with `INSERT ... ON CONFLICT` in one transaction."""
+        results: list[Order] = []
+        async with get_db() as db:
+            for start in range(0, len(orders), UPSERT_CHUNK_SIZE):
+                chunk = orders[start : start + UPSERT_CHUNK_SIZE]
+                stmt = insert(cls).values(
+                    [
+                        {
+                            "account": o.account,
+                            "stock_id": o.stock_id,
+                            "price": o.price,
+                            "quantity": o.quantity,
+                        }
+                        for o in chunk
+                    ]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["account", "stock_id"],
+                    set_={
+                        "price": stmt.excluded.price,
+                        "quantity": stmt.excluded.quantity,
+                        "updated_at": sqlmodel.func.now(),
+                    },
+                ).returning(cls)
+                result = await db.exec(stmt)
+                results.extend(result.scalars().all())
+
+        for order in results:
+            ORDER_CACHE.put(order)
+        return results
+
+    @classmethod
+    @query("order.import_many")
+    async def import_many(
+        cls, account: str, rows: Sequence[OrderRow], *, replace: bool = False
+    ) -> tuple[int, int]:
+        """Load many orders with `COPY` into a temporary table and merge them in one transaction.
+
+        Args:
+            account: The account the orders belong to.
+            rows: Validated orders, at most one per stock.
+            replace: Also delete the account's orders that are not in `rows`.
+
+        Returns:
+            The number of orders written and deleted.
+        """
+        async with get_db() as db:
+            # Also begins the transaction the raw connection below takes part in
+            await db.exec(
+                text(
+                    """
+                    CREATE TEMP TABLE order_import (
+                        stock_id VARCHAR NOT NULL, price FLOAT NOT NULL, quantity INTEGER NOT NULL
+                    ) ON COMMIT DROP
+                    """
+                )
+            )
+            raw = await (await db.connection()).get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(  # pyright: ignore[reportOptionalMemberAccess]
+                "order_import", records=rows, columns=("stock_id", "price", "quantity")
+            )
+            merged = await db.exec(
+                text(
+                    """
+                    INSERT INTO "order" (account, stock_id, price, quantity)
+                    SELECT :account, stock_id, price, quantity FROM order_import
+                    ON CONFLICT (account, stock_id) DO UPDATE
+                    SET price = EXCLUDED.price, quantity = EXCLUDED.quantity, updated_at = now()
+                    RETURNING *
+                    """
+                ),
+                params={"account": account},
+            )
+            orders = [cls.model_validate(row) for row in merged.mappings().all()]
+            deleted: list[str] = []
+            if replace:
+                result = await db.exec(
+                    text(
+                        """
+                        DELETE FROM "order" AS o WHERE o.account = :account
+                        AND NOT EXISTS (SELECT 1 FROM order_import i WHERE i.stock_id = o.stock_id)
+                        RETURNING o.stock_id
+                        """
+                    ),
+                    params={"account": account},
+                )
+                deleted = list(result.scalars().all())
+
+        for order in orders:
+            ORDER_CACHE.put(order)
+        for stock_id in deleted:
+            ORDER_CACHE.discard(account, stock_id)
+        return len(orders), len(deleted)
+
+    @classmethod
+    @query("order.delete_many")
+    async def delete_many(cls, account: str, stock_ids: Iterable[str]) -> None:
+        """Delete every order of an account whose stock ID is in `stock_ids` in one statement."""
+        stock_ids = list(stock_ids)
+        if not stock_ids:
+            return
+
+        stmt = (
+            delete(cls)
+            .where(
+                cls.account == account,
+                sqlmodel.col(cls.stock_id)
+                == any_(bindparam("stock_ids", stock_ids, type_=ARRAY(String))),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        async with get_db() as db:
+            await db.exec(stmt)
+
+        for stock_id in stock_ids:
+            ORDER_CACHE.discard(account, stock_id)
+
+    @query("order.delete")
     async def delete(self) -> None:
         async with get_db() as db:
-            await db.delete(self)
+            await db.delete(await db.merge(self))
             await db.commit()
+
+        ORDER_CACHE.discard(self.account, self.stock_id)
+
+
+ORDER_CACHE = OrderCache(Order)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import datetime
+import enum
+from typing import TYPE_CHECKING
+
+import sqlmodel
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+
+from bot.config import DEFAULT_ACCOUNT
+from bot.db.models.base import BaseModel
+from bot.db.models.order import UPSERT_CHUNK_SIZE
+from bot.db.session import get_db
+from bot.metrics import query
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from bot.placement import PlacementResult
+
+
+class PlacementStatus(enum.StrEnum):
+    CLAIMED = "claimed"
+    """About to be sent, or the process died while sending it."""
+    PLACED = "placed"
+    FAILED = "failed"
+    UNKNOWN = "unknown"
+    """The broker may have accepted the order, it is never claimed again automatically."""
+
+
+class Placement(BaseModel, table=True):
+    """Journal entry of an account's long-term order sent on a trading date.
+
+    A run claims its orders before submitting them, so an order is sent at most once per
+    trading date no matter how many runs overlap. Only failed placements are claimed again,
+    placements with an unknown outcome have to be checked against the broker by hand.
+    """
+
+    account: str = sqlmodel.Field(default=DEFAULT_ACCOUNT, primary_key=True)
+    stock_id: str = sqlmodel.Field(primary_key=True)
+    trading_date: datetime.date = sqlmodel.Field(primary_key=True)
+    status: str = PlacementStatus.CLAIMED
+    trade_id: str | None = None
+    attempts: int = 0
+    error: str | None = None
+
+    @classmethod
+    @query("placement.claim_many")
+    async def claim_many(
+        cls, account: str, stock_ids: Sequence[str], trading_date: datetime.date
+    ) -> set[str]:
+        """Atomically claim an account's orders for `trading_date`, return the stock IDs claimed."""
+        claimed: set[str] = set()
+        async with get_db() as db:
+            for start in range(0, len(stock_ids), UPSERT_CHUNK_SIZE):
+                chunk = stock_ids[start : start + UPSERT_CHUNK_SIZE]
+                stmt = insert(cls).values(
+                    [
+                        {
+                            "account": account,
+                            "stock_id": stock_id,
+                            "trading_date": trading_date,
+                            "status": PlacementStatus.CLAIMED,
+                        }
+                        for stock_id in chunk
+                    ]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["account", "stock_id", "trading_date"],
+                    set_={
+                        "status": PlacementStatus.CLAIMED,
+                        "error": None,
+                        "updated_at": sqlmodel.func.now(),
+                    },
+                    where=sqlmodel.col(cls.status) == PlacementStatus.FAILED,
+                ).returning(sqlmodel.col(cls.stock_id))
+                result = await db.exec(stmt)
+                claimed.update(result.scalars().all())
+
+        return claimed
+
+    @classmethod
+    @query("placement.finish_many")
+    async def finish_many(
+        cls, account: str, trading_date: datetime.date, results: Sequence[PlacementResult]
+    ) -> None:
+        """Record the outcome of every claimed order in a single bulk update."""
+        if not results:
+            return
+
+        async with get_db() as db:
+            await db.exec(
+                update(cls),
+                params=[
+                    {
+                        "account": account,
+                        "stock_id": r.order.stock_id,
+                        "trading_date": trading_date,
+                        "status": PlacementStatus.PLACED
+                        if r.trade is not None
+                        else PlacementStatus.UNKNOWN
+                        if r.ambiguous
+                        else PlacementStatus.FAILED,
+                        "trade_id": r.trade.order.id if r.trade is not None else None,
+                        "attempts": r.attempts,
+                        "error": repr(r.error) if r.error is not None else None,
+                    }
+                    for r in results
+                ],
+            )
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import datetime
+import enum
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import sqlmodel
+from sqlalchemy import BigInteger, func
+
+from bot.constants import UTC8
+from bot.db.session import get_db
+from bot.db.writer import EventWriter
+from bot.metrics import query
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import shioaji.constant as sjc
+
+    from bot.placement import PlacementResult
+
+
+class TradeEventKind(enum.StrEnum):
+    PLACED = "placed"
+    FAILED = "failed"
+    """The order could not be submitted, `detail` holds the error."""
+    UNKNOWN = "unknown"
+    """The broker may have accepted the order, `detail` holds the error."""
+    REJECTED = "rejected"
+    """The broker or exchange refused an order operation, `detail` holds its message."""
+    CANCELLED = "cancelled"
+    DEAL = "deal"
+    """A fill of `quantity` lots at `price`."""
+
+
+class FillSummary(NamedTuple):
+    stock_id: str
+    filled: int
+    """Lots filled."""
+    average_price: float | None
+    deals: int
+    placed: int
+    cancelled: int
+    failed: int
+    """Orders that failed to be submitted or were rejected."""
+
+
+class TradeEvent(sqlmodel.SQLModel, table=True):
+    """An append-only record of what happened to a trade.
+
+    Rows are never updated. They are written in batches by `TRADE_EVENTS` and indexed by
+    account, trading date and stock, which is what every report filters on.
+    """
+
+    __tablename__ = "trade_event"  # pyright: ignore[reportAssignmentType]
+
+    id: int | None = sqlmodel.Field(default=None, primary_key=True, sa_type=BigInteger)
+    account: str
+    trading_date: datetime.date
+    stock_id: str
+    trade_id: str | None
+    kind: str
+    price: float | None
+    quantity: int
+    occurred_at: datetime.datetime = sqlmodel.Field(
+        sa_type=sqlmodel.DateTime(timezone=True)  # pyright: ignore[reportArgumentType]
+    )
+    detail: str | None = None
+
+    @classmethod
+    def record(  # noqa: PLR0913
+        cls,
+        *,
+        account: str,
+        kind: TradeEventKind,
+        stock_id: str,
+        trade_id: str | None,
+        price: float | None,
+        quantity: int,
+        occurred_at: datetime.datetime | None = None,
+        detail: str | None = None,
+    ) -> None:
+        """Buffer an event for writing, never waits on the database."""
+        occurred_at = occurred_at or datetime.datetime.now(UTC8)
+        TRADE_EVENTS.put(
+            (
+                account,
+                occurred_at.astimezone(UTC8).date(),
+                stock_id,
+                trade_id,
+                str(kind),
+                price,
+                quantity,
+                occurred_at,
+                detail,
+            )
+        )
+
+    @classmethod
+    def record_placements(cls, account: str, results: Sequence[PlacementResult]) -> None:
+        for r in results:
+            cls.record(
+                account=account,
+                kind=TradeEventKind.PLACED
+                if r.trade is not None
+                else TradeEventKind.UNKNOWN
+                if r.ambiguous
+                else TradeEventKind.FAILED,
+                stock_id=r.order.stock_id,
+                trade_id=r.trade.order.id if r.trade is not None else None,
+                price=r.order.price,
+                quantity=r.order.quantity,
+                occurred_at=datetime.datetime.fromtimestamp(r.sent_at, UTC8),
+                detail=repr(r.error) if r.error is not None else None,
+            )
+
+    @classmethod
+    def record_order_event(cls, account: str, state: sjc.OrderState, msg: dict[str, Any]) -> None:
+        """Record the fills, cancellations and rejections in a shioaji order or deal event.
+
+        Successful new orders are skipped, they are recorded when their placement finishes.
+        """
+        # Only the trading engine feeds events, the bot imports this model without the SDK
+        import shioaji.constant as sjc  # noqa: PLC0415
+
+        if state == sjc.OrderState.StockDeal:
+            cls.record(
+                account=account,
+                kind=TradeEventKind.DEAL,
+                stock_id=msg["code"],
+                trade_id=msg["trade_id"],
+                price=float(msg["price"]),
+                quantity=msg["quantity"],
+                occurred_at=datetime.datetime.fromtimestamp(msg["ts"], UTC8)
+                if "ts" in msg
+                else None,
+            )
+            return
+        if state != sjc.OrderState.StockOrder:
+            return
+
+        operation = msg["operation"]
+        order = msg.get("order", {})
+        status = msg.get("status", {})
+        if operation["op_code"] != "00":
+            kind = TradeEventKind.REJECTED
+            quantity = order.get("quantity", 0)
+        elif operation["op_type"] == "Cancel":
+            kind = TradeEventKind.CANCELLED
+            quantity = status.get("cancel_quantity", order.get("quantity", 0))
+        else:
+            return
+
+        cls.record(
+            account=account,
+            kind=kind,
+            stock_id=msg.get("contract", {}).get("code", ""),
+            trade_id=order.get("id"),
+            price=float(order["price"]) if "price" in order else None,
+            quantity=quantity,
+            detail=operation.get("op_msg") or None,
+        )
+
+    @classmethod
+    @query("trade_event.history")
+    async def history(
+        cls, account: str, *, since: datetime.date, stock_id: str | None = None, limit: int = 20
+    ) -> Sequence[TradeEvent]:
+        """Return the latest events of an account since a trading date, newest first."""
+        stmt = sqlmodel.select(cls).where(cls.account == account, cls.trading_date >= since)
+        if stock_id is not None:
+            stmt = stmt.where(cls.stock_id == stock_id)
+        stmt = stmt.order_by(
+            sqlmodel.col(cls.trading_date).desc(), sqlmodel.col(cls.occurred_at).desc()
+        ).limit(limit)
+        async with get_db() as db:
+            events = await db.exec(stmt)
+
+        return events.all()
+
+    @classmethod
+    @query("trade_event.fill_report")
+    async def fill_report(
+        cls, account: str, *, since: datetime.date, stock_id: str | None = None
+    ) -> list[FillSummary]:
+        """Aggregate the events of an account since a trading date per stock."""
+
+        def count(*kinds: TradeEventKind) -> Any:
+            return func.count().filter(sqlmodel.col(cls.kind).in_(kinds))
+
+        is_deal = cls.kind == TradeEventKind.DEAL
+        filled = func.coalesce(func.sum(cls.quantity).filter(is_deal), 0)
+        stmt = (
+            sqlmodel.select(
+                cls.stock_id,
+                filled,
+                func.sum(cls.price * cls.quantity).filter(is_deal) / func.nullif(filled, 0),
+                count(TradeEventKind.DEAL),
+                count(TradeEventKind.PLACED),
+                count(TradeEventKind.CANCELLED),
+                count(TradeEventKind.FAILED, TradeEventKind.REJECTED),
+            )
+            .where(cls.account == account, cls.trading_date >= since)
+            .group_by(cls.stock_id)
+            .order_by(cls.stock_id)
+        )
+        if stock_id is not None:
+            stmt = stmt.where(cls.stock_id == stock_id)
+        async with get_db() as db:
+            rows = await db.exec(stmt)
+
+        return [FillSummary._make(row) for row in rows.all()]
+
+
+TRADE_EVENTS = EventWriter(
+    TradeEvent.__tablename__,
+    (
+        "account",
+        "trading_date",
+        "stock_id",
+        "trade_id",
+        "kind",
+        "price",
+        "quantity",
+        "occurred_at",
+        "detail",
+    ),
+)
+"""Write-behind buffer of `TradeEvent` rows, started by the trading engine."""
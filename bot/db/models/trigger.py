@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import datetime
+import enum
+from typing import TYPE_CHECKING
+
+import sqlmodel
+from sqlalchemy import BigInteger, any_, bindparam, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from bot.config import DEFAULT_ACCOUNT
+from bot.db.models.base import BaseModel
+from bot.db.session import get_db
+from bot.metrics import query
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+    from bot.placement import PlacementResult
+
+
+class TriggerKind(enum.StrEnum):
+    PRICE = "price"
+    """Fires when a trade prints at or below `threshold`."""
+    DROP = "drop"
+    """Fires when a trade prints `threshold` percent or more below the reference price."""
+
+
+class Trigger(BaseModel, table=True):
+    """A long-term order that is sent as soon as live quotes cross a threshold.
+
+    A trigger fires at most once. It is claimed by setting `fired_at` before the order is
+    submitted, and released again if the submission fails, so it is re-armed on the next
+    trading day. It stays claimed if the broker may have accepted the order.
+    """
+
+    id: int | None = sqlmodel.Field(default=None, primary_key=True)
+    account: str = DEFAULT_ACCOUNT
+    stock_id: str = sqlmodel.Field(index=True)
+    price: float
+    quantity: int
+    kind: str = TriggerKind.PRICE
+    threshold: float
+    fired_at: datetime.datetime | None = sqlmodel.Field(
+        default=None,
+        sa_type=sqlmodel.DateTime(timezone=True),  # pyright: ignore[reportArgumentType]
+    )
+    trade_id: str | None = None
+
+    def trigger_price(self, reference: float) -> float:
+        """Return the highest price that fires this trigger, given the day's reference price."""
+        if self.kind == TriggerKind.DROP:
+            return reference * (1 - self.threshold / 100)
+        return self.threshold
+
+    @classmethod
+    @query("trigger.create")
+    async def create(  # noqa: PLR0913
+        cls,
+        *,
+        account: str,
+        stock_id: str,
+        price: float,
+        quantity: int,
+        kind: TriggerKind,
+        threshold: float,
+    ) -> Trigger:
+        trigger = cls(
+            account=account,
+            stock_id=stock_id,
+            price=price,
+            quantity=quantity,
+            kind=kind,
+            threshold=threshold,
+        )
+        async with get_db() as db:
+            db.add(trigger)
+            await db.commit()
+            await db.refresh(trigger)
+
+        return trigger
+
+    @classmethod
+    @query("trigger.active")
+    async def active(cls, account: str) -> Sequence[Trigger]:
+        """Return every trigger of an account that has not fired yet."""
+        async with get_db() as db:
+            triggers = await db.exec(
+                sqlmodel.select(cls).where(
+                    cls.account == account, sqlmodel.col(cls.fired_at).is_(None)
+                )
+            )
+
+        return triggers.all()
+
+    @classmethod
+    @query("trigger.claim_many")
+    async def claim_many(cls, ids: Sequence[int]) -> set[int]:
+        """Atomically mark the triggers as fired, return the IDs that were not fired yet."""
+        if not ids:
+            return set()
+
+        stmt = (
+            update(cls)
+            .where(
+                sqlmodel.col(cls.id) == any_(bindparam("ids", list(ids), type_=ARRAY(BigInteger))),
+                sqlmodel.col(cls.fired_at).is_(None),
+            )
+            .values(fired_at=sqlmodel.func.now(), updated_at=sqlmodel.func.now())
+            .returning(sqlmodel.col(cls.id))
+            .execution_options(synchronize_session=False)
+        )
+        async with get_db() as db:
+            result = await db.exec(stmt)
+
+        return set(result.scalars().all())
+
+    @classmethod
+    @query("trigger.release_many")
+    async def release_many(cls, ids: Sequence[int]) -> None:
+        """Clear `fired_at` of claimed triggers whose orders were never submitted."""
+        if not ids:
+            return
+
+        stmt = (
+            update(cls)
+            .where(
+                sqlmodel.col(cls.id) == any_(bindparam("ids", list(ids), type_=ARRAY(BigInteger)))
+            )
+            .values(fired_at=None, updated_at=sqlmodel.func.now())
+            .execution_options(synchronize_session=False)
+        )
+        async with get_db() as db:
+            await db.exec(stmt)
+
+    @classmethod
+    @query("trigger.finish_many")
+    async def finish_many(cls, results: Mapping[int, PlacementResult]) -> None:
+        """Record the trade of every placed trigger and release the ones that surely failed."""
+        placed = [
+            {"id": trigger_id, "trade_id": r.trade.order.id}
+            for trigger_id, r in results.items()
+            if r.trade is not None
+        ]
+        failed = [
+            {"id": trigger_id, "fired_at": None}
+            for trigger_id, r in results.items()
+            if r.trade is None and not r.ambiguous
+        ]
+        async with get_db() as db:
+            for params in (placed, failed):
+                if params:
+                    await db.exec(update(cls), params=params)
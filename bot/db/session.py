@@ -1,13 +1,29 @@
 from __future__ import annotations
 
-from typing import Any
+import functools
+from typing import TYPE_CHECKING, Any
 
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from bot.config import CONFIG
 
-engine = create_async_engine(CONFIG.db_url)
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+@functools.cache
+def get_engine() -> AsyncEngine:
+    """Return the process-wide engine, created on first use."""
+    return create_async_engine(CONFIG.db_url)
+
+
+def asyncpg_dsn() -> str:
+    """Return `CONFIG.db_url` as a DSN for connecting with asyncpg directly."""
+    return (
+        make_url(CONFIG.db_url).set(drivername="postgresql").render_as_string(hide_password=False)
+    )
 
 
 class DatabaseSession:
@@ -16,7 +32,7 @@ class DatabaseSession:
     @staticmethod
     async def get_session() -> AsyncSession:
         """Create and return a new database session."""
-        return AsyncSession(engine, autocommit=False, autoflush=False, expire_on_commit=False)
+        return AsyncSession(get_engine(), autocommit=False, autoflush=False, expire_on_commit=False)
 
     @staticmethod
     async def commit_session(session: AsyncSession) -> None:
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from collections import deque
+from typing import TYPE_CHECKING, Any
+
+import asyncpg
+from loguru import logger
+
+from bot.config import CONFIG
+from bot.db.session import asyncpg_dsn
+from bot.metrics import EVENT_ROWS
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+class EventWriter:
+    """A write-behind buffer that appends rows to a table with `COPY`.
+
+    `put` only appends to an in-memory buffer, so recording an event never waits on the
+    database. A background task copies the buffer every `CONFIG.event_flush_interval`
+    seconds, or as soon as `CONFIG.event_batch_size` rows are waiting. Rows that fail to
+    be written stay buffered and are retried, up to `CONFIG.max_buffered_events` rows.
+    """
+
+    def __init__(self, table: str, columns: Sequence[str]) -> None:
+        self.table = table
+        self.columns = tuple(columns)
+        self._rows: deque[tuple[Any, ...]] = deque()
+        self._conn: asyncpg.Connection | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def put(self, row: tuple[Any, ...]) -> None:
+        """Buffer a row with a value for each of `columns`, must be called on the event loop."""
+        if len(self._rows) >= CONFIG.max_buffered_events:
+            self._rows.popleft()
+            EVENT_ROWS.inc(table=self.table, result="dropped")
+        self._rows.append(row)
+        if len(self._rows) >= CONFIG.event_batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write every buffered row, return how many were written."""
+        async with self._flush_lock:
+            if not self._rows:
+                return 0
+
+            rows, self._rows = self._rows, deque()
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(asyncpg_dsn())
+                await self._conn.copy_records_to_table(
+                    self.table, records=rows, columns=self.columns
+                )
+            except Exception as e:
+                logger.warning(f"Failed to write {len(rows)} rows to {self.table}: {e!r}")
+                EVENT_ROWS.inc(len(rows), table=self.table, result="retried")
+                # Put the rows back in front of the ones buffered meanwhile
+                rows.extend(self._rows)
+                while len(rows) > CONFIG.max_buffered_events:
+                    rows.popleft()
+                    EVENT_ROWS.inc(table=self.table, result="dropped")
+                self._rows = rows
+                await self._disconnect()
+                return 0
+
+            EVENT_ROWS.inc(len(rows), table=self.table, result="written")
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), CONFIG.event_flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _disconnect(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            with contextlib.suppress(Exception):
+                await conn.close()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background task and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+        if self._rows:
+            logger.warning(f"Dropped {len(self._rows)} unwritten rows of {self.table}")
+        await self._disconnect()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from loguru import logger
+
+from bot.metrics import SHIOAJI_QUEUE_DEPTH, SHIOAJI_QUEUE_WAIT
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+class Lane(enum.IntEnum):
+    """Priority of a blocking call, lower values are run first."""
+
+    ORDER = 0
+    SESSION = 1
+    QUERY = 2
+
+
+class _WorkItem(NamedTuple):
+    lane: Lane
+    seq: int
+    queued_at: float
+    future: Future[Any] | None
+    func: Callable[[], Any] | None
+
+
+class PriorityExecutor:
+    """A bounded thread pool that runs queued calls in `Lane` order.
+
+    Calls in the same lane run in submission order. Threads are started on demand up to
+    `workers`, so an idle executor costs nothing.
+    """
+
+    def __init__(self, workers: int, *, name: str = "executor") -> None:
+        if workers < 1:
+            msg = "workers must be at least 1"
+            raise ValueError(msg)
+
+        self.workers = workers
+        self.name = name
+        self._queue: queue.PriorityQueue[_WorkItem] = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads: list[threading.Thread] = []
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit[R](self, lane: Lane, func: Callable[[], R]) -> Future[R]:
+        with self._lock:
+            if self._shutdown:
+                msg = f"{self.name} has been shut down"
+                raise RuntimeError(msg)
+
+            future: Future[R] = Future()
+            self._queue.put(_WorkItem(lane, next(self._seq), time.perf_counter(), future, func))
+            SHIOAJI_QUEUE_DEPTH.inc(lane=lane.name)
+            if not self._idle.acquire(blocking=False) and len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._worker, name=f"{self.name}-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    async def run[R](self, lane: Lane, func: Callable[[], R]) -> R:
+        """Run `func` on the executor and wait for its result without blocking the loop."""
+        return await asyncio.wrap_future(self.submit(lane, func))
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item.future is None or item.func is None:
+                return
+
+            SHIOAJI_QUEUE_DEPTH.dec(lane=item.lane.name)
+            SHIOAJI_QUEUE_WAIT.observe(time.perf_counter() - item.queued_at, lane=item.lane.name)
+            # Skipped when the awaiting coroutine was cancelled while the call was queued
+            if item.future.set_running_or_notify_cancel():
+                try:
+                    result = item.func()
+                except BaseException as e:
+                    item.future.set_exception(e)
+                else:
+                    item.future.set_result(result)
+            self._idle.release()
+
+    def shutdown(self) -> None:
+        """Stop the workers once every queued call has run."""
+        with self._lock:
+            if self._shutdown:
+                return
+
+            self._shutdown = True
+            for _ in self._threads:
+                # Sorts after every real call so pending work still runs
+                self._queue.put(_WorkItem(Lane.QUERY, next(self._seq) + 2**62, 0.0, None, None))
+        logger.debug(f"Shut down {self.name} with {len(self._threads)} threads")
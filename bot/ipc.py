@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import pickle  # noqa: S403
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+from bot.trade_book import TradeBook
+
+if TYPE_CHECKING:
+    from bot.contracts import ContractCatalog
+    from bot.db.models.order import Order
+    from bot.db.models.trigger import Trigger, TriggerKind
+    from bot.quotes import Quote
+    from bot.trading import TradingEngine
+
+_FRAME = struct.Struct("!I")
+
+TIMEOUTS = {"place_now": 600.0}
+"""Seconds to wait for commands that take longer than `EngineClient.timeout`.
+
+`place_now` is paced by the order rate limit.
+"""
+
+
+class EngineError(RuntimeError):
+    """A command failed inside the trading engine process."""
+
+
+async def _send(writer: asyncio.StreamWriter, message: Any) -> None:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_FRAME.pack(len(data)) + data)
+    await writer.drain()
+
+
+async def _receive(reader: asyncio.StreamReader) -> Any:
+    (size,) = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    return pickle.loads(await reader.readexactly(size))  # noqa: S301
+
+
+class EngineServer:
+    """Serves a `TradingEngine` to the bot process over a Unix socket.
+
+    Messages are length-prefixed pickles, so the socket is only readable and writable by
+    the user running the engine.
+    """
+
+    def __init__(self, engine: TradingEngine, path: str) -> None:
+        self.engine = engine
+        self.path = Path(path)
+        self._server: asyncio.Server | None = None
+
+    async def _dispatch(self, command: str, kwargs: dict[str, Any]) -> Any:  # noqa: PLR0911
+        match command:
+            case "create_order":
+                return await self.engine.create_order(**kwargs)
+            case "create_trigger":
+                return await self.engine.create_trigger(**kwargs)
+            case "cancel_trade":
+                return await self.engine.cancel_trade(**kwargs)
+            case "list_trades":
+                return (await self.engine.trade_book(**kwargs)).pre_submitted()
+            case "place_now":
+                return await self.engine.place_now()
+            case "quotes":
+                return await self.engine.quotes(**kwargs)
+            case "catalog":
+                return (await self.engine.get_catalog()).built_at
+            case _:
+                msg = f"Unknown engine command {command!r}"
+                raise ValueError(msg)
+
+    async def _reply(self, command: str, kwargs: dict[str, Any]) -> tuple[str, Any]:
+        try:
+            return "ok", await self._dispatch(command, kwargs)
+        except Exception as e:
+            logger.exception(f"Engine command {command!r} failed")
+            return "error", f"{type(e).__name__}: {e}"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            command, kwargs = await _receive(reader)
+            await _send(writer, await self._reply(command, kwargs))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        # Bind under a restrictive umask, the socket accepts connections as soon as it exists
+        # and anyone who can connect can make the engine unpickle their data
+        umask = os.umask(0o077)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+        finally:
+            os.umask(umask)
+        self.path.chmod(0o600)
+        logger.info(f"Trading engine listening on {self.path}")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.path.unlink(missing_ok=True)
+
+
+class EngineClient:
+    """A `Trader` that forwards every command to a trading engine process."""
+
+    def __init__(self, path: str, catalog: ContractCatalog, *, timeout: float = 30.0) -> None:
+        self.path = path
+        self.catalog = catalog
+        self.timeout = timeout
+
+    async def _request(self, command: str, **kwargs: Any) -> Any:
+        # One connection per command, so a long place_now never holds up the UI
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            async with asyncio.timeout(TIMEOUTS.get(command, self.timeout)):
+                await _send(writer, (command, kwargs))
+                status, result = await _receive(reader)
+        finally:
+            writer.close()
+
+        if status == "error":
+            raise EngineError(result)
+        return result
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def create_order(
+        self, *, account: str, stock_id: str, price: float, quantity: int
+    ) -> Order | None:
+        return await self._request(
+            "create_order", account=account, stock_id=stock_id, price=price, quantity=quantity
+        )
+
+    async def create_trigger(  # noqa: PLR0913
+        self,
+        *,
+        account: str,
+        stock_id: str,
+        price: float,
+        quantity: int,
+        kind: TriggerKind,
+        threshold: float,
+    ) -> Trigger | None:
+        return await self._request(
+            "create_trigger",
+            account=account,
+            stock_id=stock_id,
+            price=price,
+            quantity=quantity,
+            kind=kind,
+            threshold=threshold,
+        )
+
+    async def cancel_trade(self, *, account: str, trade_id: str) -> bool:
+        return await self._request("cancel_trade", account=account, trade_id=trade_id)
+
+    async def trade_book(self, *, account: str) -> TradeBook:
+        book = TradeBook()
+        book.replace(await self._request("list_trades", account=account))
+        return book
+
+    async def place_now(self) -> int:
+        return await self._request("place_now")
+
+    async def quotes(self, codes: list[str]) -> dict[str, Quote]:
+        return await self._request("quotes", codes=codes)
+
+    async def get_catalog(self) -> ContractCatalog:
+        """Return the local catalog, reloaded if the engine rebuilt the shared file."""
+        built_at = await self._request("catalog")
+        if built_at != self.catalog.built_at:
+            self.catalog.reload()
+        return self.catalog
@@ -3,11 +3,17 @@ from __future__ import annotations
 import inspect
 import logging
 import sys
+from typing import ClassVar
 
 from loguru import logger
 
+from bot.config import CONFIG
+
 
 class InterceptHandler(logging.Handler):
+    _depths: ClassVar[dict[tuple[str, int], int]] = {}
+    """Stack depth of the logging call, cached per call site."""
+
     def emit(self, record: logging.LogRecord) -> None:
         # Get corresponding Loguru level if it exists.
         level: str | int
@@ -16,18 +22,34 @@ class InterceptHandler(logging.Handler):
         except ValueError:
             level = record.levelno
 
-        # Find caller from where originated the logged message.
-        frame, depth = inspect.currentframe(), 0
-        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
-            frame = frame.f_back
-            depth += 1
+        # Find caller from where originated the logged message, once per call site.
+        call_site = (record.pathname, record.lineno)
+        depth = self._depths.get(call_site)
+        if depth is None:
+            frame, depth = inspect.currentframe(), 0
+            while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+                frame = frame.f_back
+                depth += 1
+            self._depths[call_site] = depth
 
         logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
 
 def setup_logging() -> None:
+    """Route stdlib logging through loguru and add the console and file sinks.
+
+    With `log_enqueue` the sinks write from a background thread, so a slow terminal or
+    disk never blocks the event loop. `log_json` writes the log file as JSON lines.
+    """
     logging.basicConfig(handlers=[InterceptHandler()], level=logging.INFO, force=True)
 
     logger.remove()
-    logger.add(sys.stderr, level="INFO")
-    logger.add("logs/log.log", rotation="1 day", retention="1 week", level="DEBUG")
+    logger.add(sys.stderr, level="INFO", enqueue=CONFIG.log_enqueue)
+    logger.add(
+        "logs/log.jsonl" if CONFIG.log_json else "logs/log.log",
+        rotation="1 day",
+        retention="1 week",
+        level="DEBUG",
+        enqueue=CONFIG.log_enqueue,
+        serialize=CONFIG.log_json,
+    )
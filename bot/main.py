@@ -1,24 +1,73 @@
 from __future__ import annotations
 
+import asyncio
+import importlib
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import discord
 from discord.ext import commands
 from loguru import logger
-from sqlmodel import SQLModel
 
-from bot.db.session import engine
+from bot.config import CONFIG
+from bot.contracts import ContractCatalog
+from bot.db.migrations import migrate
+from bot.db.models.order import ORDER_CACHE
+from bot.metrics import MetricsServer
+from bot.startup import STARTUP
 from bot.ui.main import MainView
+from bot.watchdog import WATCHDOG
+
+if TYPE_CHECKING:
+    from bot.trading import Trader
 
 
 class Bot(commands.Bot):
     def __init__(self) -> None:
         super().__init__(commands.when_mentioned, intents=discord.Intents.default())
+        self.contracts = ContractCatalog(Path(CONFIG.contract_catalog_path))
+        self.metrics = (
+            MetricsServer(CONFIG.metrics_host, CONFIG.metrics_port)
+            if CONFIG.metrics_port is not None
+            else None
+        )
+        self._trader: asyncio.Task[Trader] | None = None
+
+    async def _start_trader(self) -> Trader:
+        # The shioaji SDK takes a while to import, so it is imported in a thread while the
+        # bot connects to Discord instead of on the startup path
+        with STARTUP.phase("trader"):
+            if CONFIG.engine_socket is not None:
+                ipc = await asyncio.to_thread(importlib.import_module, "bot.ipc")
+                trader: Trader = ipc.EngineClient(CONFIG.engine_socket, self.contracts)
+            else:
+                trading = await asyncio.to_thread(importlib.import_module, "bot.trading")
+                trader = trading.TradingEngine(trading.create_pool(self.contracts))
+            await trader.start()
+        return trader
+
+    async def get_trader(self) -> Trader:
+        """Return the trading engine, or the client of the engine process, once started."""
+        # Restart a start that failed or was cancelled, exception() raises on a cancelled task
+        task = self._trader
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            self._trader = asyncio.create_task(self._start_trader())
+        return await asyncio.shield(self._trader)
 
     async def setup_hook(self) -> None:
+        STARTUP.mark("imports")
+        await WATCHDOG.start()
+        if self.metrics is not None:
+            await self.metrics.start()
+
         # Initialize db
-        async with engine.begin() as conn:
-            await conn.run_sync(SQLModel.metadata.create_all)
+        await migrate()
+        STARTUP.mark("migrations")
+        await ORDER_CACHE.start()
+        STARTUP.mark("order cache")
+
+        # Connect to the broker and schedule the orders, unless a separate engine does
+        self._trader = asyncio.create_task(self._start_trader())
 
         # Load cogs
         for filepath in Path("bot/cogs").glob("**/*.py"):
@@ -31,3 +80,24 @@ class Bot(commands.Bot):
 
         # Add persistent view
         self.add_view(MainView())
+        STARTUP.mark("cogs")
+
+    async def on_ready(self) -> None:
+        if not STARTUP.reported:
+            STARTUP.mark("gateway")
+            STARTUP.report()
+
+    async def close(self) -> None:
+        if self._trader is not None:
+            try:
+                trader = await self._trader
+            except Exception:
+                logger.exception("Trading engine failed to start")
+            else:
+                await trader.close()
+        self.contracts.close()
+        await ORDER_CACHE.close()
+        if self.metrics is not None:
+            await self.metrics.close()
+        await WATCHDOG.close()
+        await super().close()
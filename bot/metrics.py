@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import contextlib
+import functools
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Generator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+type Labels = tuple[tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> Labels:
+        return tuple((name, str(labels[name])) for name in self.label_names)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines.extend(f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items())
+        return lines
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[Labels, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines.extend(f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items())
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("count", "counts", "sum")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+        self._series: dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.count += 1
+            series.sum += value
+
+    @contextlib.contextmanager
+    def time(self, errors: Counter | None = None, **labels: str) -> Generator[None]:
+        """Observe how long the block takes, counting it in `errors` if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if errors is not None:
+                errors.inc(**labels)
+            raise
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q: float, **labels: str) -> float | None:
+        """Estimate a quantile by interpolating within the matching bucket."""
+        series = self._series.get(self._key(labels))
+        if series is None or series.count == 0:
+            return None
+
+        rank = q * series.count
+        seen = 0
+        for i, count in enumerate(series.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def series(self) -> list[tuple[dict[str, str], int, float]]:
+        """Return the labels, count and sum of every series."""
+        return [(dict(k), s.count, s.sum) for k, s in self._series.items()]
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series.counts, strict=True):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+            lines.extend(
+                (
+                    f"{self.name}_sum{_format_labels(key)} {series.sum}",
+                    f"{self.name}_count{_format_labels(key)} {series.count}",
+                )
+            )
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Metric] = []
+
+    def register[M: Metric](self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        return "\n".join(line for m in self._metrics for line in m.render()) + "\n"
+
+    def summary(self) -> str:
+        """Return a human readable count, mean, p50 and p99 for every histogram series."""
+        lines: list[str] = []
+        for metric in self._metrics:
+            if not isinstance(metric, Histogram):
+                continue
+            for labels, count, total in sorted(metric.series(), key=lambda s: str(s[0])):
+                if not count:
+                    continue
+                p50 = metric.quantile(0.5, **labels) or 0.0
+                p99 = metric.quantile(0.99, **labels) or 0.0
+                label = ",".join(f"{k}={v}" for k, v in labels.items())
+                lines.append(
+                    f"{metric.name}[{label}] n={count} mean={total / count * 1000:.1f}ms "
+                    f"p50={p50 * 1000:.1f}ms p99={p99 * 1000:.1f}ms"
+                )
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+SHIOAJI_CALLS = REGISTRY.register(
+    Histogram("shioaji_call_seconds", "Duration of shioaji SDK calls", ("method",))
+)
+SHIOAJI_ERRORS = REGISTRY.register(
+    Counter("shioaji_call_errors_total", "Failed shioaji SDK calls", ("method",))
+)
+DB_QUERIES = REGISTRY.register(
+    Histogram("db_query_seconds", "Duration of Order queries", ("query",))
+)
+DB_ERRORS = REGISTRY.register(Counter("db_query_errors_total", "Failed Order queries", ("query",)))
+SHIOAJI_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("shioaji_queue_depth", "Shioaji calls waiting for an executor thread", ("lane",))
+)
+SHIOAJI_QUEUE_WAIT = REGISTRY.register(
+    Histogram("shioaji_queue_wait_seconds", "Time shioaji calls wait for a thread", ("lane",))
+)
+SNAPSHOT_REQUESTS = REGISTRY.register(
+    Counter("snapshot_requests_total", "Snapshot reads by cache result", ("snapshot", "result"))
+)
+EVENT_ROWS = REGISTRY.register(
+    Counter("event_rows_total", "Rows of append-only tables by write result", ("table", "result"))
+)
+LOOP_LAG = REGISTRY.register(
+    Histogram(
+        "event_loop_lag_seconds",
+        "Delay of the event loop in waking up a sleeping task",
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    )
+)
+LOOP_STALLS = REGISTRY.register(
+    Counter("event_loop_stalls_total", "Times the event loop was blocked past the threshold")
+)
+STARTUP_PHASES = REGISTRY.register(
+    Gauge("startup_phase_seconds", "Duration of each startup phase", ("phase",))
+)
+INTERACTIONS = REGISTRY.register(
+    Histogram("interaction_seconds", "Duration of Discord interaction handlers", ("handler",))
+)
+INTERACTION_ERRORS = REGISTRY.register(
+    Counter("interaction_errors_total", "Failed Discord interaction handlers", ("handler",))
+)
+
+
+def timed[**P, R](
+    histogram: Histogram, errors: Counter, **labels: str
+) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Decorate a coroutine function so every call is observed in `histogram`."""
+
+    def decorator(func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with histogram.time(errors, **labels):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def handler[**P, R](name: str) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Time a Discord interaction handler."""
+    return timed(INTERACTIONS, INTERACTION_ERRORS, handler=name)
+
+
+def query[**P, R](name: str) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Time an `Order` query."""
+    return timed(DB_QUERIES, DB_ERRORS, query=name)
+
+
+class MetricsServer:
+    """Serves `REGISTRY` in the Prometheus text format over plain HTTP."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._server: asyncio.Server | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = REGISTRY.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from bot.price_rules import PriceIssue, check_price
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from bot.contracts import ContractCatalog
+    from bot.db.models.order import Order
+
+FIELDS = ("stock_id", "price", "quantity")
+"""Columns of an order file, CSV files start with them as a header."""
+MAX_ERRORS = 20
+"""Invalid rows reported before parsing gives up on a file."""
+
+
+class OrderRow(NamedTuple):
+    stock_id: str
+    price: float
+    quantity: int
+
+
+class ParsedOrders(NamedTuple):
+    rows: list[OrderRow]
+    """Valid rows, the last one wins when a stock appears more than once."""
+    errors: list[str]
+    """One message per invalid row, prefixed with its line number."""
+
+
+def _records(stream: io.TextIOBase, fmt: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        missing = set(FIELDS) - set(reader.fieldnames or ())
+        if missing:
+            msg = f"CSV header is missing {', '.join(sorted(missing))}"
+            raise ValueError(msg)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_num, line in enumerate(stream, 1):
+            if line.strip():
+                yield line_num, json.loads(line)
+    elif fmt == "json":
+        # A JSON array has to be decoded whole, prefer JSON lines for large files
+        yield from enumerate(json.load(stream), 1)
+    else:
+        msg = f"Unsupported order file format {fmt!r}"
+        raise ValueError(msg)
+
+
+def _validate(record: dict[str, Any], catalog: ContractCatalog) -> OrderRow | str:
+    stock_id = str(record.get("stock_id") or "").strip()
+    if stock_id not in catalog:
+        return f"unknown stock {stock_id!r}"
+
+    try:
+        price = float(record["price"])
+        quantity = int(record["quantity"])
+    except (KeyError, TypeError, ValueError) as e:
+        return f"invalid price or quantity ({e})"
+
+    if price <= 0 or quantity <= 0:
+        return "price and quantity must be positive"
+    check = check_price(catalog, stock_id, price)
+    if check.issue == PriceIssue.OFF_TICK:
+        return f"price {price} is off tick, the nearest valid price is {check.snapped}"
+    return OrderRow(stock_id, price, quantity)
+
+
+def _rows(
+    stream: io.TextIOBase, fmt: str, catalog: ContractCatalog
+) -> Iterator[tuple[int, OrderRow | str]]:
+    try:
+        for line_num, record in _records(stream, fmt):
+            yield (
+                line_num,
+                _validate(record, catalog) if isinstance(record, dict) else "not an object",
+            )
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        # The file itself is malformed, no line number applies
+        yield 0, str(e)
+
+
+def parse_orders(data: bytes, fmt: str, catalog: ContractCatalog) -> ParsedOrders:
+    """Parse and validate an order file row by row against the contract catalog.
+
+    Args:
+        data: The file content, UTF-8 with or without a byte order mark.
+        fmt: `csv`, `jsonl` or `json`.
+        catalog: Today's contract catalog.
+    """
+    rows: dict[str, OrderRow] = {}
+    errors: list[str] = []
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    for line_num, row in _rows(stream, fmt, catalog):
+        if isinstance(row, str):
+            errors.append(f"line {line_num}: {row}" if line_num else row)
+            if len(errors) >= MAX_ERRORS:
+                break
+        else:
+            rows[row.stock_id] = row
+    return ParsedOrders(list(rows.values()), errors)
+
+
+def dump_orders(orders: Iterable[Order], fmt: str) -> Iterator[str]:
+    """Serialize orders chunk by chunk in a format `parse_orders` reads back."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(FIELDS)
+        for order in orders:
+            writer.writerow((order.stock_id, order.price, order.quantity))
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == "jsonl":
+        for order in orders:
+            yield (
+                json.dumps(
+                    {"stock_id": order.stock_id, "price": order.price, "quantity": order.quantity}
+                )
+                + "\n"
+            )
+    else:
+        msg = f"Unsupported order file format {fmt!r}"
+        raise ValueError(msg)
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import statistics
+import time
+from typing import TYPE_CHECKING, NamedTuple
+
+import shioaji.constant as sjc
+import shioaji.error as sje
+from loguru import logger
+
+if TYPE_CHECKING:
+    import datetime
+    from collections.abc import Sequence
+
+    from shioaji.contracts import Contract
+    from shioaji.order import Order as ShioajiOrder
+    from shioaji.order import Trade
+
+    from bot.db.models.order import Order
+    from bot.shioaji import AsyncShioaji
+
+
+class TokenBucket:
+    """An asyncio token bucket that allows `rate` acquisitions per second on average."""
+
+    def __init__(self, rate: float, *, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class PreparedOrder(NamedTuple):
+    """An order with its contract and broker order object built ahead of submission."""
+
+    order: Order
+    contract: Contract
+    order_obj: ShioajiOrder
+
+
+def prepare_order(api: AsyncShioaji, order: Order) -> PreparedOrder | None:
+    """Build the contract and broker order for a long-term order, None if the stock is unknown."""
+    contract = api.get_stock(order.stock_id)
+    if contract is None:
+        logger.warning(f"Contract {order.stock_id} not found")
+        return None
+
+    order_obj = api.Order(
+        price=order.price,
+        quantity=order.quantity,
+        action=sjc.Action.Buy,
+        price_type=sjc.StockPriceType.LMT,
+        order_type=sjc.OrderType.ROD,
+        account=api.stock_account,
+    )
+    return PreparedOrder(order=order, contract=contract, order_obj=order_obj)
+
+
+class PlacementBatch(NamedTuple):
+    target: datetime.datetime
+    """When the orders should reach the broker."""
+    orders: list[PreparedOrder]
+
+
+class PlacementResult(NamedTuple):
+    order: Order
+    trade: Trade | None
+    sent_at: float
+    """Unix timestamp of when the first submit call started."""
+    latency: float
+    """Seconds spent submitting the order, including retries."""
+    elapsed: float
+    """Seconds from the start of the run until the submit call returned."""
+    error: BaseException | None = None
+    attempts: int = 1
+
+    @property
+    def ambiguous(self) -> bool:
+        """Whether the broker may have accepted the order even though no trade was returned."""
+        return isinstance(self.error, AmbiguousSubmitError)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the broker while the circuit breaker is open."""
+
+
+class AmbiguousSubmitError(RuntimeError):
+    """Raised when the broker may have accepted an order but its trades could not be checked."""
+
+
+class CircuitBreaker:
+    """Stops calling the broker after `threshold` consecutive failures.
+
+    Once open, calls fail fast until `reset_timeout` seconds have passed, then a single
+    trial call is let through. A success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, *, threshold: int, reset_timeout: float) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def open(self) -> bool:
+        return self._opened_at is not None
+
+    def check(self) -> None:
+        """Raise `CircuitOpenError` unless a call may be made now."""
+        if self._opened_at is None:
+            return
+
+        if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+            msg = f"Circuit open after {self._failures} consecutive broker failures"
+            raise CircuitOpenError(msg)
+        self._trial = True
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("Broker recovered, closing circuit")
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial = False
+        if self._failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning(f"Opening circuit after {self._failures} consecutive failures")
+            self._opened_at = time.monotonic()
+
+
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+    ConnectionError,
+    sje.TimeoutError,
+    sje.SystemMaintenance,
+)
+"""Broker errors that are worth retrying."""
+
+AMBIGUOUS_ERRORS: tuple[type[BaseException], ...] = (sje.TimeoutError,)
+"""Errors after which the broker may have accepted the order anyway."""
+
+PENDING_STATUSES = frozenset(
+    (sjc.Status.PendingSubmit, sjc.Status.PreSubmitted, sjc.Status.Submitted)
+)
+"""Statuses of a trade that was accepted and has not been filled or cancelled yet."""
+
+
+class PlacementEngine:
+    """Submits orders concurrently through a bounded worker pool behind a rate limit.
+
+    Transient failures are retried with jittered exponential backoff, and a circuit
+    breaker stops hammering the broker once it keeps failing.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        workers: int,
+        rate_limit: float,
+        max_attempts: int = 3,
+        backoff: float = 0.2,
+        max_backoff: float = 2.0,
+        retry_on: tuple[type[BaseException], ...] = TRANSIENT_ERRORS,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.workers = workers
+        self.bucket = TokenBucket(rate_limit)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self.breaker = breaker or CircuitBreaker(threshold=10, reset_timeout=5.0)
+
+    async def _was_submitted(self, api: AsyncShioaji, prepared: PreparedOrder) -> Trade | None:
+        """Look for a working trade of the order after an ambiguous failure.
+
+        Only a trade still waiting to be filled with the order's action, price and quantity
+        counts, so an earlier fill or another order of the same stock is not mistaken for it.
+        """
+        await api.update_status()
+        trades = await api.list_trades()
+        order = prepared.order_obj
+        return next(
+            (
+                t
+                for t in trades
+                if t.contract.code == prepared.contract.code
+                and t.status.status in PENDING_STATUSES
+                and t.order.action == order.action
+                and t.order.price == order.price
+                and t.order.quantity == order.quantity
+            ),
+            None,
+        )
+
+    async def _resolve(
+        self, api: AsyncShioaji, prepared: PreparedOrder, error: BaseException
+    ) -> Trade | None:
+        try:
+            return await self._was_submitted(api, prepared)
+        except Exception as e:
+            msg = (
+                f"Order {prepared.order.stock_id} may have been placed despite {error!r}, "
+                f"checking the trades failed: {e!r}"
+            )
+            raise AmbiguousSubmitError(msg) from error
+
+    async def _submit(self, api: AsyncShioaji, prepared: PreparedOrder) -> tuple[Trade, int]:
+        """Submit an order, retrying transient failures, and return the trade and attempts."""
+        attempt = 1
+        while True:
+            self.breaker.check()
+            await self.bucket.acquire()
+            try:
+                trade = await api.place_order(prepared.contract, prepared.order_obj)
+            except self.retry_on as e:
+                self.breaker.record_failure()
+                if isinstance(e, AMBIGUOUS_ERRORS):
+                    # Checked on every attempt including the last, so that an order the
+                    # broker accepted is never reported as failed and sent again later
+                    trade = await self._resolve(api, prepared, e)
+                    if trade is not None:
+                        logger.warning(f"Order {prepared.order.stock_id} went through despite {e}")
+                        return trade, attempt
+
+                if attempt >= self.max_attempts:
+                    raise
+
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                logger.warning(
+                    f"Failed to place order {prepared.order.stock_id} ({e}), "
+                    f"retrying in {delay:.3f}s"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return trade, attempt
+
+    async def run(
+        self, api: AsyncShioaji, orders: Sequence[PreparedOrder]
+    ) -> list[PlacementResult]:
+        """Send prepared orders to the broker and return the results in completion order."""
+        queue: asyncio.Queue[PreparedOrder] = asyncio.Queue()
+        for order in orders:
+            queue.put_nowait(order)
+
+        results: list[PlacementResult] = []
+        started_at = time.monotonic()
+
+        async def worker() -> None:
+            while not queue.empty():
+                prepared = queue.get_nowait()
+
+                sent_at = time.time()
+                submitted_at = time.monotonic()
+                attempts = 1
+                try:
+                    trade, attempts = await self._submit(api, prepared)
+                except CircuitOpenError as e:
+                    logger.error(f"Skipped order {prepared.order.stock_id}: {e}")
+                    trade, error = None, e
+                except Exception as e:
+                    logger.exception(f"Failed to place order {prepared.order.stock_id}")
+                    trade, error = None, e
+                else:
+                    logger.info(f"Placed order {trade.order.id} for {prepared.order.stock_id}")
+                    error = None
+
+                now = time.monotonic()
+                results.append(
+                    PlacementResult(
+                        order=prepared.order,
+                        trade=trade,
+                        sent_at=sent_at,
+                        latency=now - submitted_at,
+                        elapsed=now - started_at,
+                        error=error,
+                        attempts=attempts,
+                    )
+                )
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(orders)))))
+        self.log_summary(results)
+        return results
+
+    @staticmethod
+    def log_summary(results: Sequence[PlacementResult]) -> None:
+        if not results:
+            logger.info("No orders were submitted")
+            return
+
+        latencies = sorted(r.latency for r in results)
+        failed = sum(r.error is not None for r in results)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        logger.info(
+            f"Submitted {len(results)} orders ({failed} failed) in "
+            f"{max(r.elapsed for r in results):.3f}s, submit latency "
+            f"p50={statistics.median(latencies):.3f}s p99={p99:.3f}s max={latencies[-1]:.3f}s"
+        )
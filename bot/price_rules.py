@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import bisect
+import enum
+from typing import TYPE_CHECKING, NamedTuple
+
+from bot.contracts import SecurityCategory
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from bot.contracts import ContractCatalog
+
+_LADDERS = {
+    SecurityCategory.STOCK: ((1_000, 5_000, 10_000, 50_000, 100_000), (1, 5, 10, 50, 100, 500)),
+    SecurityCategory.ETF: ((5_000,), (1, 5)),
+}
+"""Upper bounds of the price bands and the tick size of each band, in cents, per category."""
+
+
+class PriceIssue(enum.StrEnum):
+    UNKNOWN_STOCK = "unknown_stock"
+    OFF_TICK = "off_tick"
+    """Not a multiple of the tick size, `PriceCheck.snapped` is the next valid price below."""
+    BELOW_LIMIT_DOWN = "below_limit_down"
+    ABOVE_LIMIT_UP = "above_limit_up"
+
+
+class PriceCheck(NamedTuple):
+    stock_id: str
+    price: float
+    snapped: float
+    """The price rounded down onto the tick ladder, equal to `price` if it already was."""
+    tick: float | None
+    """Tick size at `price`, None if the catalog cannot classify the security."""
+    limit_down: float | None
+    limit_up: float | None
+    issue: PriceIssue | None
+
+    @property
+    def sendable(self) -> bool:
+        """Whether the price can be sent today as it is, the broker would reject anything else."""
+        return self.issue is None
+
+
+def _to_cents(price: float) -> int:
+    return round(price * 100)
+
+
+def _tick_cents(cents: int, category: SecurityCategory) -> int:
+    bounds, ticks = _LADDERS[category]
+    return ticks[bisect.bisect_right(bounds, cents)]
+
+
+def tick_size(price: float, category: SecurityCategory = SecurityCategory.STOCK) -> float:
+    """Return the tick size of a stock or ETF price."""
+    return _tick_cents(_to_cents(price), category) / 100
+
+
+def snap(price: float, category: SecurityCategory = SecurityCategory.STOCK) -> float:
+    """Round a price down onto the tick ladder, a buy order never pays more than asked."""
+    cents = _to_cents(price)
+    if abs(price * 100 - cents) > 1e-6:
+        # Finer than a cent, round down to the cent first
+        cents = int(price * 100)
+    cents -= cents % _tick_cents(cents, category)
+    return cents / 100
+
+
+def check_prices(catalog: ContractCatalog, orders: Iterable[tuple[str, float]]) -> list[PriceCheck]:
+    """Check many `(stock_id, price)` pairs against the tick ladder and today's price limits.
+
+    The limits and security categories come from the contract catalog, which is rebuilt
+    every trading day, so a whole order book is checked without a broker round trip. The
+    tick size is not checked for securities the catalog cannot classify.
+    """
+    checks: list[PriceCheck] = []
+    for stock_id, price in orders:
+        limits = catalog.limits(stock_id)
+        category = catalog.category(stock_id)
+        if limits is None or category is None:
+            checks.append(
+                PriceCheck(stock_id, price, price, None, None, None, PriceIssue.UNKNOWN_STOCK)
+            )
+            continue
+
+        if category == SecurityCategory.UNKNOWN:
+            snapped, tick = price, None
+        else:
+            snapped, tick = snap(price, category), tick_size(price, category)
+
+        limit_down, limit_up = limits
+        # Contracts without published limits, such as newly listed stocks, have zeros
+        if limit_up and price < limit_down:
+            issue = PriceIssue.BELOW_LIMIT_DOWN
+        elif limit_up and price > limit_up:
+            issue = PriceIssue.ABOVE_LIMIT_UP
+        elif snapped != price:
+            issue = PriceIssue.OFF_TICK
+        else:
+            issue = None
+        checks.append(PriceCheck(stock_id, price, snapped, tick, limit_down, limit_up, issue))
+    return checks
+
+
+def check_price(catalog: ContractCatalog, stock_id: str, price: float) -> PriceCheck:
+    (check,) = check_prices(catalog, [(stock_id, price)])
+    return check
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, NamedTuple
+
+from loguru import logger
+
+from bot.config import CONFIG
+from bot.metrics import SNAPSHOT_REQUESTS
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from bot.shioaji import ShioajiSession
+
+SNAPSHOTS_CHUNK_SIZE = 500
+"""Contracts per `api.snapshots` call, the SDK rejects larger requests."""
+
+
+class Quote(NamedTuple):
+    code: str
+    close: float
+    """Last traded price."""
+    change_rate: float
+    """Percent change from the reference price."""
+
+
+class QuoteService:
+    """Last prices of stocks, fetched in as few `api.snapshots` calls as possible.
+
+    A quote is cached for `CONFIG.quotes_ttl` seconds. Codes that miss the cache are
+    fetched together in chunks of `SNAPSHOTS_CHUNK_SIZE`, and callers asking for a code
+    that is already being fetched wait for that fetch instead of starting another.
+    """
+
+    def __init__(self, session: ShioajiSession) -> None:
+        self.session = session
+        self._quotes: dict[str, tuple[Quote, float]] = {}
+        self._inflight: dict[str, asyncio.Future[Quote | None]] = {}
+
+    async def get_many(self, codes: Iterable[str]) -> dict[str, Quote]:
+        """Return the quotes of `codes`, leaving out the stocks the broker has none for."""
+        now = time.monotonic()
+        quotes: dict[str, Quote] = {}
+        waiting: dict[str, asyncio.Future[Quote | None]] = {}
+        missing: list[str] = []
+        for code in dict.fromkeys(codes):
+            cached = self._quotes.get(code)
+            if cached is not None and now - cached[1] <= CONFIG.quotes_ttl:
+                SNAPSHOT_REQUESTS.inc(snapshot="quotes", result="hit")
+                quotes[code] = cached[0]
+            elif code in self._inflight:
+                SNAPSHOT_REQUESTS.inc(snapshot="quotes", result="shared")
+                waiting[code] = self._inflight[code]
+            else:
+                SNAPSHOT_REQUESTS.inc(snapshot="quotes", result="miss")
+                missing.append(code)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            for code in missing:
+                waiting[code] = self._inflight[code] = loop.create_future()
+            # Shielded, so a cancelled caller does not fail the callers sharing the fetch
+            await asyncio.shield(asyncio.create_task(self._fetch(missing)))
+
+        for code, future in waiting.items():
+            quote = await asyncio.shield(future)
+            if quote is not None:
+                quotes[code] = quote
+        return quotes
+
+    async def _fetch(self, codes: list[str]) -> None:
+        try:
+            api = await self.session.get()
+            contracts = [c for code in codes if (c := api.get_stock(code)) is not None]
+            fetched_at = time.monotonic()
+            for start in range(0, len(contracts), SNAPSHOTS_CHUNK_SIZE):
+                for snapshot in await api.snapshots(
+                    contracts[start : start + SNAPSHOTS_CHUNK_SIZE]
+                ):
+                    quote = Quote(snapshot.code, float(snapshot.close), float(snapshot.change_rate))
+                    self._quotes[quote.code] = (quote, fetched_at)
+        except Exception as e:
+            logger.warning(f"Failed to fetch quotes of {len(codes)} stocks: {e!r}")
+        finally:
+            # Also when cancelled, or every later caller of these codes would wait forever
+            for code in codes:
+                future = self._inflight.pop(code)
+                cached = self._quotes.get(code)
+                if not future.done():
+                    future.set_result(cached[0] if cached is not None else None)
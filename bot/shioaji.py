@@ -1,64 +1,467 @@
 from __future__ import annotations
 
 import asyncio
-from typing import TYPE_CHECKING
+import contextlib
+import functools
+import time
+from typing import TYPE_CHECKING, Any
 
 import shioaji as sj
+import shioaji.constant as sjc
 from loguru import logger
+from shioaji.contracts import Stock
 
 from bot.config import CONFIG
+from bot.db.models.trade_event import TradeEvent
+from bot.executor import Lane, PriorityExecutor
+from bot.metrics import SHIOAJI_CALLS, SHIOAJI_ERRORS
+from bot.snapshot import Snapshot
+from bot.trade_book import TradeBook
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
     from types import EllipsisType
 
     from shioaji.contracts import Contract
+    from shioaji.data import Snapshot as MarketSnapshot
+    from shioaji.data import UsageStatus
     from shioaji.order import Order, Trade
     from shioaji.position import FuturePosition, StockPosition
+    from shioaji.stream_data_type import TickSTKv1
+
+    from bot.config import Account
+    from bot.contracts import ContractCatalog
+
+
+@functools.cache
+def get_executor() -> PriorityExecutor:
+    """Return the executor of blocking SDK calls, kept apart from asyncio's default thread pool."""
+    return PriorityExecutor(CONFIG.shioaji_workers, name="shioaji")
+
+
+LANES = {
+    "place_order": Lane.ORDER,
+    "cancel_order": Lane.ORDER,
+    "login": Lane.SESSION,
+    "logout": Lane.SESSION,
+    "activate_ca": Lane.SESSION,
+    "usage": Lane.SESSION,
+}
+"""Executor lane of each SDK call, anything else runs in `Lane.QUERY`."""
 
 
 class AsyncShioaji(sj.Shioaji):
-    def __init__(self, *, simulation: bool | EllipsisType = ...) -> None:
-        self.simulation = simulation if simulation is not ... else CONFIG.simulation
+    def __init__(
+        self,
+        *,
+        simulation: bool | EllipsisType = ...,
+        catalog: ContractCatalog | None = None,
+        account: Account | None = None,
+        executor: PriorityExecutor | None = None,
+    ) -> None:
+        super().__init__(simulation=simulation if simulation is not ... else CONFIG.simulation)
+        self.catalog = catalog
+        self.account = account or CONFIG.all_accounts()[0]
+        self.executor = executor or get_executor()
 
     async def __aenter__(self) -> AsyncShioaji:
-        await self.login(api_key=CONFIG.shioaji_api_key, secret_key=CONFIG.shioaji_api_secret)
-        await self.activate_ca(
-            ca_path=CONFIG.ca_path, ca_passwd=CONFIG.ca_password, person_id=CONFIG.ca_person_id
-        )
-        logger.info(f"Initialized shioaji api with simulation={self.simulation}")
+        await self.connect()
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback) -> None:  # noqa: ANN001
         await self.logout()
 
+    async def _call[**P, R](
+        self, method: str, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs
+    ) -> R:
+        """Run a blocking SDK call on `executor` and record its duration."""
+        lane = LANES.get(method, Lane.QUERY)
+        with SHIOAJI_CALLS.time(SHIOAJI_ERRORS, method=method):
+            return await self.executor.run(lane, functools.partial(func, *args, **kwargs))
+
+    async def connect(self, *, fetch_contract: bool = True) -> None:
+        """Login and activate the CA with the credentials of `account`."""
+        await self.login(
+            api_key=self.account.shioaji_api_key,
+            secret_key=self.account.shioaji_api_secret,
+            fetch_contract=fetch_contract,
+        )
+        await self.activate_ca(
+            ca_path=self.account.ca_path,
+            ca_passwd=self.account.ca_password,
+            person_id=self.account.ca_person_id,
+        )
+        logger.info(
+            f"Initialized shioaji api for account {self.account.name!r} "
+            f"with simulation={self.simulation}"
+        )
+
     async def place_order(self, contract: Contract, order: Order) -> Trade:
-        return await asyncio.to_thread(super().place_order, contract, order)
+        return await self._call("place_order", super().place_order, contract, order)
 
     async def list_trades(self) -> list[Trade]:
-        return await asyncio.to_thread(super().list_trades)
+        return await self._call("list_trades", super().list_trades)
 
     async def cancel_order(self, trade: Trade) -> None:
-        await asyncio.to_thread(super().cancel_order, trade)
+        await self._call("cancel_order", super().cancel_order, trade)
 
-    async def login(self, api_key: str, secret_key: str) -> None:
-        await asyncio.to_thread(super().login, api_key, secret_key)
+    async def login(self, api_key: str, secret_key: str, *, fetch_contract: bool = True) -> None:
+        await self._call("login", super().login, api_key, secret_key, fetch_contract=fetch_contract)
 
     async def logout(self) -> None:
-        await asyncio.to_thread(super().logout)
+        await self._call("logout", super().logout)
 
     async def activate_ca(self, ca_path: str, ca_passwd: str, person_id: str) -> None:
-        await asyncio.to_thread(super().activate_ca, ca_path, ca_passwd, person_id)
+        await self._call("activate_ca", super().activate_ca, ca_path, ca_passwd, person_id)
 
     async def list_positions(self) -> list[StockPosition | FuturePosition]:
-        return await asyncio.to_thread(super().list_positions, self.stock_account)  # pyright: ignore[reportArgumentType]
+        return await self._call("list_positions", super().list_positions, self.stock_account)  # pyright: ignore[reportArgumentType]
 
     async def update_status(self) -> None:
-        await asyncio.to_thread(super().update_status, self.stock_account)  # pyright: ignore[reportArgumentType]
+        await self._call("update_status", super().update_status, self.stock_account)  # pyright: ignore[reportArgumentType]
+
+    async def usage(self) -> UsageStatus:
+        return await self._call("usage", super().usage)
+
+    async def snapshots(self, contracts: list[Contract]) -> list[MarketSnapshot]:
+        return await self._call("snapshots", super().snapshots, contracts)  # pyright: ignore[reportArgumentType]
+
+    async def subscribe_ticks(self, contract: Contract) -> None:
+        await self._call(
+            "subscribe",
+            self.quote.subscribe,
+            contract,
+            quote_type=sjc.QuoteType.Tick,
+            version=sjc.QuoteVersion.v1,
+        )
+
+    async def unsubscribe_ticks(self, contract: Contract) -> None:
+        await self._call(
+            "unsubscribe",
+            self.quote.unsubscribe,
+            contract,
+            quote_type=sjc.QuoteType.Tick,
+            version=sjc.QuoteVersion.v1,
+        )
+
+    def set_tick_callback(self, func: Callable[[sjc.Exchange, TickSTKv1], None]) -> None:
+        """Call `func` from the SDK's thread for every tick of a subscribed stock."""
+        self.quote.set_on_tick_stk_v1_callback(func)
+
+    async def fetch_contracts(self) -> None:
+        await self._call("fetch_contracts", super().fetch_contracts, contract_download=True)
 
     def get_stock(self, stock_id: str) -> Contract | None:
+        if self.catalog is not None and self.catalog.exists:
+            entry = self.catalog.get(stock_id)
+            if entry is None:
+                return None
+
+            return Stock(
+                exchange=sjc.Exchange(entry.exchange),
+                code=entry.code,
+                symbol=f"{entry.exchange}{entry.code}",
+                name=entry.name,
+                unit=entry.unit,
+                limit_up=entry.limit_up,
+                limit_down=entry.limit_down,
+                reference=entry.reference,
+            )
+
         for _ in range(3):
             stock = self.Contracts.Stocks.get(stock_id)
             if stock is not None:
                 return stock
 
         return None
+
+
+class BrokerUnavailableError(RuntimeError):
+    """The broker could not be logged in to within the time a caller is willing to wait."""
+
+
+class ShioajiSession:
+    """The shioaji session of one account, logged in once and shared by all callers.
+
+    The session re-authenticates when the broker reports the session is down, when the
+    token reaches `max_age`, or when the periodic health check fails. Reconnects are
+    retried with exponential backoff. Order and deal events are fed into `trades`, which
+    is reconciled against `list_trades` every `reconcile_interval` seconds.
+
+    Positions and reconciled trades are cached as `Snapshot`s, so concurrent readers
+    share one broker round trip. Call `invalidate` after placing or cancelling orders.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        catalog: ContractCatalog,
+        account: Account,
+        *,
+        api_factory: Callable[..., AsyncShioaji] = AsyncShioaji,
+        health_check_interval: float = 60.0,
+        max_age: float = 23 * 60 * 60,
+        max_backoff: float = 60.0,
+        reconcile_interval: float = 300.0,
+    ) -> None:
+        self.health_check_interval = health_check_interval
+        self.max_age = max_age
+        self.max_backoff = max_backoff
+        self.reconcile_interval = reconcile_interval
+        self.catalog = catalog
+        self.account = account
+        self.api_factory = api_factory
+        self.trades = TradeBook()
+        self._trades_snapshot = Snapshot(self._fetch_trades, ttl=CONFIG.trades_ttl, name="trades")
+        self._positions = Snapshot(
+            self._fetch_positions, ttl=CONFIG.positions_ttl, name="positions"
+        )
+
+        self._api: AsyncShioaji | None = None
+        self._connected_at = 0.0
+        self._stale = False
+        self._lock = asyncio.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._monitor: asyncio.Task[None] | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self._api is not None and not self._expired
+
+    @property
+    def _expired(self) -> bool:
+        return self._stale or time.monotonic() - self._connected_at > self.max_age
+
+    async def get(self) -> AsyncShioaji:
+        """Return the shared api, logging in first if the session is missing or expired.
+
+        Raises:
+            BrokerUnavailableError: If `CONFIG.broker_connect_attempts` logins failed, or
+                another login did not finish within `CONFIG.broker_connect_timeout`.
+        """
+        api = self._api
+        if api is not None and not self._expired:
+            return api
+        return await self._connect(
+            attempts=CONFIG.broker_connect_attempts, wait=CONFIG.broker_connect_timeout
+        )
+
+    async def _connect(
+        self, *, attempts: int | None = None, wait: float | None = None
+    ) -> AsyncShioaji:
+        """Login while holding the session lock, retrying with exponential backoff.
+
+        Args:
+            attempts: Logins to try before giving up, None to retry until one succeeds.
+            wait: Seconds to wait for the lock held by another login, None to wait forever.
+        """
+        try:
+            async with asyncio.timeout(wait):
+                await self._lock.acquire()
+        except TimeoutError:
+            msg = f"Broker unavailable, still logging in {self.account.name!r} after {wait:g}s"
+            raise BrokerUnavailableError(msg) from None
+
+        try:
+            # Another caller may have reconnected while we were waiting for the lock.
+            if self._api is not None and not self._expired:
+                return self._api
+
+            await self._disconnect()
+            return await self._login(attempts)
+        finally:
+            self._lock.release()
+
+    async def _login(self, attempts: int | None) -> AsyncShioaji:
+        delay = 1.0
+        attempt = 0
+        while True:
+            attempt += 1
+            api = self.api_factory(catalog=self.catalog, account=self.account)
+            # Skip the full contract download when today's catalog is already on disk
+            fetch_contract = not self.catalog.is_fresh()
+            try:
+                await api.connect(fetch_contract=fetch_contract)
+                if fetch_contract:
+                    await self._build_catalog(api)
+            except Exception as e:
+                if attempts is not None and attempt >= attempts:
+                    msg = f"Broker unavailable, {attempt} logins of {self.account.name!r} failed"
+                    raise BrokerUnavailableError(msg) from e
+                logger.exception(f"Failed to connect to shioaji, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            api.set_session_down_callback(self._on_session_down)
+            api.set_order_callback(self._on_order_event)
+            self._api = api
+            self._connected_at = time.monotonic()
+            self._stale = False
+            self._positions.invalidate()
+
+            try:
+                await self._reconcile(api)
+            except Exception:
+                logger.exception("Failed to load trades after connecting")
+            return api
+
+    async def _build_catalog(self, api: AsyncShioaji) -> None:
+        await asyncio.to_thread(self.catalog.write_stocks, api.Contracts.Stocks)
+        self.catalog.reload()
+
+    async def refresh_catalog(self) -> None:
+        """Rebuild the contract catalog if it predates today's contract update."""
+        if self.catalog.is_fresh():
+            return
+
+        api = await self.get()
+        await api.fetch_contracts()
+        await self._build_catalog(api)
+
+    async def _reconcile(self, api: AsyncShioaji) -> None:
+        await api.update_status()
+        self.trades.replace(await api.list_trades())
+        self._trades_snapshot.set(self.trades)
+
+    async def _fetch_trades(self) -> TradeBook:
+        await self._reconcile(await self.get())
+        return self.trades
+
+    async def reconcile_trades(self, *, max_age: float | None = None) -> TradeBook:
+        """Refresh the trade book from the broker unless it was reconciled within `max_age`.
+
+        Catches any missed order events. `max_age` defaults to `CONFIG.trades_ttl`.
+        """
+        return await self._trades_snapshot.get(max_age=max_age)
+
+    async def _fetch_positions(self) -> list[StockPosition | FuturePosition]:
+        return await (await self.get()).list_positions()
+
+    async def positions(
+        self, *, max_age: float | None = None
+    ) -> list[StockPosition | FuturePosition]:
+        """Return the account's positions, fetched at most once every `CONFIG.positions_ttl`."""
+        return await self._positions.get(max_age=max_age)
+
+    def invalidate(self) -> None:
+        """Drop the cached positions and trades after orders were placed or cancelled."""
+        self._positions.invalidate()
+        self._trades_snapshot.invalidate()
+
+    def _on_order_event(self, state: sjc.OrderState, msg: dict[str, Any]) -> None:
+        # Called from the SDK's thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._apply_order_event, state, msg)
+
+    def _apply_order_event(self, state: sjc.OrderState, msg: dict[str, Any]) -> None:
+        self.trades.on_order_event(state, msg)
+        TradeEvent.record_order_event(self.account.name, state, msg)
+
+    async def get_catalog(self) -> ContractCatalog:
+        """Return the contract catalog, waiting for the first login if it was never built."""
+        if not self.catalog.exists:
+            await self.get()
+        return self.catalog
+
+    async def _disconnect(self) -> None:
+        api, self._api = self._api, None
+        if api is None:
+            return
+
+        try:
+            await api.logout()
+        except Exception:
+            logger.warning("Failed to logout stale shioaji session")
+
+    def _on_session_down(self) -> None:
+        # Called from the SDK's thread
+        logger.warning("Shioaji session is down")
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(setattr, self, "_stale", True)
+        else:
+            self._stale = True
+
+    async def health_check(self) -> bool:
+        """Return whether the current session is logged in and responsive."""
+        if self._api is None or self._expired:
+            return False
+
+        try:
+            await self._api.usage()
+        except Exception:
+            logger.warning("Shioaji health check failed")
+            return False
+        return True
+
+    async def _monitor_session(self) -> None:
+        while True:
+            if not await self.health_check():
+                self._stale = True
+                await self._connect()
+
+            try:
+                await self.refresh_catalog()
+            except Exception:
+                logger.exception("Failed to refresh contract catalog")
+
+            if self._trades_snapshot.age >= self.reconcile_interval:
+                try:
+                    await self.reconcile_trades()
+                except Exception:
+                    logger.exception("Failed to reconcile trades")
+            await asyncio.sleep(self.health_check_interval)
+
+    async def start(self) -> None:
+        """Start the background task that connects and keeps the session healthy."""
+        self._loop = asyncio.get_running_loop()
+        if self._monitor is None:
+            self._monitor = asyncio.create_task(self._monitor_session())
+
+    async def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._monitor
+            self._monitor = None
+
+        await self._disconnect()
+
+
+class SessionPool:
+    """One `ShioajiSession` per configured account, all sharing one contract catalog."""
+
+    def __init__(
+        self,
+        catalog: ContractCatalog,
+        accounts: Iterable[Account],
+        *,
+        api_factory: Callable[..., AsyncShioaji] = AsyncShioaji,
+    ) -> None:
+        self.catalog = catalog
+        self.sessions = {
+            account.name: ShioajiSession(catalog, account, api_factory=api_factory)
+            for account in accounts
+        }
+
+    def __getitem__(self, account: str) -> ShioajiSession:
+        session = self.sessions.get(account)
+        if session is None:
+            msg = f"Unknown account {account!r}"
+            raise KeyError(msg)
+        return session
+
+    def __iter__(self) -> Iterator[ShioajiSession]:
+        return iter(self.sessions.values())
+
+    async def get_catalog(self) -> ContractCatalog:
+        """Return the contract catalog, waiting for the first login if it was never built."""
+        if not self.catalog.exists:
+            await next(iter(self)).get()
+        return self.catalog
+
+    async def start(self) -> None:
+        for session in self:
+            await session.start()
+
+    async def close(self) -> None:
+        await asyncio.gather(*(session.close() for session in self))
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+import shioaji as sj
+import shioaji.constant as sjc
+from shioaji.account import StockAccount
+from shioaji.contracts import Stock
+from shioaji.data import UsageStatus
+from shioaji.order import Order, OrderStatus, Trade
+from shioaji.position import StockPosition
+
+from bot.shioaji import AsyncShioaji
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+    from types import EllipsisType
+
+    from shioaji.contracts import Contract
+
+    from bot.config import Account
+    from bot.contracts import ContractCatalog
+    from bot.executor import PriorityExecutor
+
+
+class SimBrokerError(RuntimeError):
+    """An error injected by the simulated broker."""
+
+
+class SimRateLimitError(SimBrokerError):
+    """Raised when orders are submitted faster than the simulated rate limit."""
+
+
+class SimStocks:
+    """Stands in for `api.Contracts.Stocks`, iterating yields one list per exchange."""
+
+    def __init__(self, contracts: list[Stock]) -> None:
+        self._by_code = {c.code: c for c in contracts}
+        self._by_exchange: dict[sjc.Exchange, list[Stock]] = {}
+        for c in contracts:
+            self._by_exchange.setdefault(c.exchange, []).append(c)
+
+    def __iter__(self) -> Iterator[list[Stock]]:
+        return iter(self._by_exchange.values())
+
+    def get(self, code: str) -> Stock | None:
+        return self._by_code.get(code)
+
+
+class SimContracts(NamedTuple):
+    Stocks: SimStocks
+
+
+class SimTick(NamedTuple):
+    """The fields of `TickSTKv1` that are read from the simulated quote feed."""
+
+    code: str
+    close: Decimal
+    datetime: datetime.datetime
+
+
+class SimSnapshot(NamedTuple):
+    """The fields of `Snapshot` that are read from the simulated broker."""
+
+    code: str
+    close: float
+    change_rate: float
+
+
+class SimQuote:
+    """Stands in for `api.quote`, receives the ticks published to its `SimMarket`."""
+
+    def __init__(self, market: SimMarket) -> None:
+        self.market = market
+        self.codes: set[str] = set()
+        self._callback: Callable[[sjc.Exchange, SimTick], None] | None = None
+        market.quotes.append(self)
+
+    def subscribe(self, contract: Contract, *_: Any, **__: Any) -> None:
+        self.market.block()
+        self.codes.add(contract.code)
+
+    def unsubscribe(self, contract: Contract, *_: Any, **__: Any) -> None:
+        self.market.block()
+        self.codes.discard(contract.code)
+
+    def set_on_tick_stk_v1_callback(
+        self,
+        func: Callable[[sjc.Exchange, SimTick], None],
+        bind: bool = False,  # noqa: ARG002
+    ) -> None:
+        self._callback = func
+
+    def emit(self, tick: SimTick) -> None:
+        if self._callback is not None and tick.code in self.codes:
+            self._callback(sjc.Exchange.TSE, tick)
+
+
+class SimMarket:
+    """Shared state and behaviour of the simulated broker.
+
+    Args:
+        contracts: Number of stock contracts to generate.
+        trades: Number of pre-submitted trades that already exist on the account.
+        positions: Number of held positions.
+        latency: Mean seconds every broker call blocks for.
+        jitter: Maximum seconds added to or removed from `latency`.
+        login_latency: Seconds a login blocks for, on top of `latency`.
+        rate_limit: Orders accepted per second before `SimRateLimitError` is raised.
+        error_rate: Probability that any broker call raises `SimBrokerError`.
+        seed: Seed for the random generator, for reproducible runs.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        contracts: int = 2000,
+        trades: int = 0,
+        positions: int = 0,
+        latency: float = 0.02,
+        jitter: float = 0.01,
+        login_latency: float = 1.0,
+        rate_limit: float | None = None,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.login_latency = login_latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self.stocks = SimStocks(
+            [
+                Stock(
+                    exchange=sjc.Exchange.TSE if i % 3 else sjc.Exchange.OTC,
+                    code=str(1000 + i),
+                    symbol=f"SIM{1000 + i}",
+                    name=f"模擬{1000 + i}",
+                    category="24",
+                    unit=1000,
+                    reference=100.0,
+                    limit_up=110.0,
+                    limit_down=90.0,
+                )
+                for i in range(contracts)
+            ]
+        )
+        self.account = StockAccount(person_id="SIM", broker_id="9A95", account_id="0000000")
+
+        self.trades: dict[str, Trade] = {}
+        self.quotes: list[SimQuote] = []
+        self.last_prices: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self._submitted_at: deque[float] = deque()
+        codes = [str(1000 + i) for i in range(contracts)]
+        for code in self.random.sample(codes, min(trades, len(codes))):
+            self.new_trade(self.stocks.get(code), self.new_order())  # pyright: ignore[reportArgumentType]
+
+        self.positions = [
+            StockPosition(
+                id=i,
+                code=code,
+                direction=sjc.Action.Buy,
+                quantity=1,
+                price=100.0,
+                last_price=100.0,
+                pnl=0.0,
+                yd_quantity=1,
+                margin_purchase_amount=0,
+                collateral=0,
+                short_sale_margin=0,
+                interest=0,
+            )
+            for i, code in enumerate(self.random.sample(codes, min(positions, len(codes))))
+        ]
+
+    def new_order(self) -> Order:
+        return Order(
+            price=100.0,
+            quantity=1,
+            action=sjc.Action.Buy,
+            price_type=sjc.StockPriceType.LMT,
+            order_type=sjc.OrderType.ROD,
+            account=self.account,
+        )
+
+    def new_trade(self, contract: Contract, order: Order) -> Trade:
+        order.id = uuid.uuid4().hex[:8]
+        trade = Trade(contract, order, OrderStatus(id=order.id, status=sjc.Status.PreSubmitted))
+        with self.lock:
+            self.trades[order.id] = trade
+        return trade
+
+    def publish(self, code: str, price: float) -> None:
+        """Send a tick to every quote feed subscribed to `code`, from the calling thread."""
+        tick = SimTick(code=code, close=Decimal(str(price)), datetime=datetime.datetime.now())  # noqa: DTZ005
+        self.last_prices[code] = price
+        for quote in self.quotes:
+            quote.emit(tick)
+
+    def block(self, extra: float = 0.0) -> None:
+        """Block the calling thread like a broker round trip and maybe raise an error."""
+        time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter) + extra))
+        if self.random.random() < self.error_rate:
+            msg = "Injected broker error"
+            raise SimBrokerError(msg)
+
+    def check_rate_limit(self) -> None:
+        if self.rate_limit is None:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            while self._submitted_at and now - self._submitted_at[0] > 1:
+                self._submitted_at.popleft()
+            if len(self._submitted_at) >= self.rate_limit:
+                msg = f"More than {self.rate_limit} orders in the last second"
+                raise SimRateLimitError(msg)
+            self._submitted_at.append(now)
+
+
+class _SimBroker(sj.Shioaji):
+    """Replaces the blocking shioaji SDK calls underneath `AsyncShioaji`."""
+
+    market: SimMarket
+
+    def __init__(self, simulation: bool = True) -> None:
+        self.simulation = simulation
+        self.Order = Order
+        self.stock_account = None
+        self._order_callback: Callable[[sjc.OrderState, dict[str, Any]], None] | None = None
+        self.quote = SimQuote(self.market)
+
+    def login(self, api_key: str, secret_key: str, fetch_contract: bool = True, **_: Any) -> None:  # noqa: ARG002
+        self.market.block(self.market.login_latency)
+        self.stock_account = self.market.account
+        if fetch_contract:
+            self.Contracts = SimContracts(self.market.stocks)
+
+    def fetch_contracts(self, contract_download: bool = False, **_: Any) -> None:  # noqa: ARG002
+        self.market.block()
+        self.Contracts = SimContracts(self.market.stocks)
+
+    def logout(self) -> bool:
+        self.market.block()
+        return True
+
+    def activate_ca(self, ca_path: str, ca_passwd: str, person_id: str = "", **_: Any) -> bool:  # noqa: ARG002
+        self.market.block()
+        return True
+
+    def usage(self, **_: Any) -> UsageStatus:
+        self.market.block()
+        return UsageStatus(connections=1)
+
+    def place_order(self, contract: Contract, order: Order, **_: Any) -> Trade:
+        self.market.check_rate_limit()
+        self.market.block()
+        trade = self.market.new_trade(contract, order)
+        if self._order_callback is not None:
+            self._order_callback(
+                sjc.OrderState.StockOrder,
+                {
+                    "operation": {"op_type": "New", "op_code": "00", "op_msg": ""},
+                    "order": {"id": order.id},
+                    "status": {"id": order.id, "order_quantity": order.quantity},
+                    "contract": {"code": contract.code},
+                },
+            )
+        return trade
+
+    def cancel_order(self, trade: Trade, **_: Any) -> Trade:
+        self.market.check_rate_limit()
+        self.market.block()
+        trade.status.status = sjc.Status.Cancelled
+        return trade
+
+    def list_trades(self) -> list[Trade]:
+        with self.market.lock:
+            return list(self.market.trades.values())
+
+    def snapshots(self, contracts: list[Contract], **_: Any) -> list[SimSnapshot]:
+        self.market.block()
+        snapshots: list[SimSnapshot] = []
+        for contract in contracts:
+            close = self.market.last_prices.get(contract.code, contract.reference)
+            change_rate = (close / contract.reference - 1) * 100 if contract.reference else 0.0
+            snapshots.append(SimSnapshot(contract.code, close, round(change_rate, 2)))
+        return snapshots
+
+    def update_status(self, account: Any = None, **_: Any) -> None:  # noqa: ARG002
+        self.market.block()
+
+    def list_positions(self, account: Any = None, **_: Any) -> list[StockPosition]:  # noqa: ARG002
+        self.market.block()
+        return list(self.market.positions)
+
+    def set_session_down_callback(self, func: Callable[[], None]) -> None:
+        pass
+
+    def set_order_callback(self, func: Callable[[sjc.OrderState, dict[str, Any]], None]) -> None:
+        self._order_callback = func
+
+
+class SimShioaji(AsyncShioaji, _SimBroker):
+    """An `AsyncShioaji` backed by a `SimMarket` instead of a Sinopac account."""
+
+    def __init__(
+        self,
+        *,
+        market: SimMarket,
+        simulation: bool | EllipsisType = ...,
+        catalog: ContractCatalog | None = None,
+        account: Account | None = None,
+        executor: PriorityExecutor | None = None,
+    ) -> None:
+        self.market = market
+        super().__init__(simulation=simulation, catalog=catalog, account=account, executor=executor)
+
+
+class TickReplay:
+    """Replays recorded ticks into a `SimMarket`, standing in for the live quote feed.
+
+    Args:
+        market: The market to publish the ticks to.
+        ticks: `(code, price)` pairs in the order they printed.
+    """
+
+    def __init__(self, market: SimMarket, ticks: Iterable[tuple[str, float]]) -> None:
+        self.market = market
+        self.ticks = list(ticks)
+
+    @classmethod
+    def from_csv(cls, market: SimMarket, path: Path) -> TickReplay:
+        """Load ticks from a CSV file with `code` and `price` columns."""
+        with path.open(newline="", encoding="utf-8") as f:
+            return cls(market, [(row["code"], float(row["price"])) for row in csv.DictReader(f)])
+
+    @classmethod
+    def random_walk(
+        cls, market: SimMarket, codes: Iterable[str], *, count: int, step: float = 0.005
+    ) -> TickReplay:
+        """Generate `count` ticks that walk each stock's price away from its reference."""
+        prices = {code: market.stocks.get(code).reference for code in codes}  # pyright: ignore[reportOptionalMemberAccess]
+        ticks: list[tuple[str, float]] = []
+        for code in market.random.choices(list(prices), k=count):
+            prices[code] = round(prices[code] * (1 + market.random.uniform(-step, step)), 2)
+            ticks.append((code, prices[code]))
+        return cls(market, ticks)
+
+    def play(self, *, rate: float | None = None) -> int:
+        """Publish every tick from the calling thread, at most `rate` per second.
+
+        Run it in a thread, like the SDK delivers quotes, and return the ticks published.
+        """
+        started_at = time.monotonic()
+        for i, (code, price) in enumerate(self.ticks):
+            if rate is not None:
+                time.sleep(max(0.0, started_at + i / rate - time.monotonic()))
+            self.market.publish(code, price)
+        return len(self.ticks)
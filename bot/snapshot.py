@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+from bot.metrics import SNAPSHOT_REQUESTS
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+
+class Snapshot[T]:
+    """A value fetched at most once every `ttl` seconds.
+
+    Concurrent callers that miss the cache share a single in-flight fetch. `invalidate`
+    forces the next caller to fetch again, without handing it a fetch that was already
+    running when the data changed.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[T]], *, ttl: float, name: str) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self.name = name
+        self._value: T | None = None
+        self._fetched_at: float | None = None
+        self._inflight: asyncio.Task[T] | None = None
+        self._generation = 0
+
+    @property
+    def age(self) -> float:
+        """Seconds since the cached value was fetched, infinite if there is none."""
+        if self._fetched_at is None:
+            return float("inf")
+        return time.monotonic() - self._fetched_at
+
+    async def get(self, *, max_age: float | None = None) -> T:
+        """Return the cached value, fetching it first if it is older than `max_age` or `ttl`."""
+        if self._value is not None and self.age <= (self.ttl if max_age is None else max_age):
+            SNAPSHOT_REQUESTS.inc(snapshot=self.name, result="hit")
+            return self._value
+
+        if self._inflight is None:
+            SNAPSHOT_REQUESTS.inc(snapshot=self.name, result="miss")
+            self._inflight = asyncio.create_task(self._refresh(self._generation))
+        else:
+            SNAPSHOT_REQUESTS.inc(snapshot=self.name, result="shared")
+        # A cancelled caller must not cancel the fetch the other callers are waiting on
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self, generation: int) -> T:
+        started_at = time.monotonic()
+        try:
+            value = await self.fetch()
+        finally:
+            if generation == self._generation:
+                self._inflight = None
+
+        if generation == self._generation:
+            self._value, self._fetched_at = value, started_at
+        return value
+
+    def set(self, value: T) -> None:
+        """Store a value that was fetched outside of `get`."""
+        self._value, self._fetched_at = value, time.monotonic()
+
+    def invalidate(self) -> None:
+        self._value = self._fetched_at = self._inflight = None
+        self._generation += 1
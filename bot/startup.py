@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import contextlib
+import time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.metrics import STARTUP_PHASES
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+
+class StartupTimer:
+    """Records how long each phase of startup takes, from when this module is imported."""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self._marked_at = self.started_at
+        self.phases: dict[str, float] = {}
+        self.reported = False
+
+    def _record(self, name: str, seconds: float) -> None:
+        self.phases[name] = seconds
+        STARTUP_PHASES.set(seconds, phase=name)
+
+    def mark(self, name: str) -> None:
+        """Record the time since the previous mark as phase `name`."""
+        now = time.perf_counter()
+        self._record(name, now - self._marked_at)
+        self._marked_at = now
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Generator[None]:
+        """Record how long the block takes, for phases that overlap with others."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    def report(self) -> None:
+        self.reported = True
+        total = time.perf_counter() - self.started_at
+        breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        logger.info(f"Started in {total:.3f}s: {breakdown}")
+
+
+STARTUP = StartupTimer()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import bisect
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any
+
+import shioaji.constant as sjc
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from shioaji.order import Trade
+
+
+class TradeBook:
+    """A live, in-memory view of the account's trades.
+
+    Trades are indexed by id, status and stock code. The book is kept current by the
+    SDK's order and deal callbacks and periodically reconciled against `list_trades`
+    to catch missed events.
+    """
+
+    def __init__(self) -> None:
+        self._trades: dict[str, Trade] = {}
+        self._by_status: defaultdict[sjc.Status, dict[str, Trade]] = defaultdict(dict)
+        self._by_code: defaultdict[str, dict[str, Trade]] = defaultdict(dict)
+        self.version = 0
+        """Incremented on every change to the index, for invalidating derived views."""
+
+    def __len__(self) -> int:
+        return len(self._trades)
+
+    def get(self, trade_id: str) -> Trade | None:
+        return self._trades.get(trade_id)
+
+    def by_status(self, status: sjc.Status) -> list[Trade]:
+        return list(self._by_status[status].values())
+
+    def by_code(self, code: str) -> list[Trade]:
+        return list(self._by_code[code].values())
+
+    def pre_submitted(self) -> list[Trade]:
+        return self.by_status(sjc.Status.PreSubmitted)
+
+    def page(
+        self,
+        status: sjc.Status = sjc.Status.PreSubmitted,
+        *,
+        after: tuple[str, str] | None = None,
+        prefix: str = "",
+        limit: int = 25,
+    ) -> list[Trade]:
+        """Return up to `limit` trades with `status` ordered by stock code and trade id.
+
+        Args:
+            status: Status of the trades to return.
+            after: The (code, trade id) cursor of the last trade on the previous page.
+            prefix: Only return trades whose stock code starts with this.
+            limit: Maximum number of trades to return.
+        """
+        keys = sorted(
+            (t.contract.code, trade_id)
+            for trade_id, t in self._by_status[status].items()
+            if t.contract.code.startswith(prefix)
+        )
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+        return [self._trades[trade_id] for _, trade_id in keys[start : start + limit]]
+
+    def codes_with_status(self, status: sjc.Status) -> set[str]:
+        return {t.contract.code for t in self._by_status[status].values()}
+
+    def _unindex(self, trade: Trade) -> None:
+        self._by_status[trade.status.status].pop(trade.order.id, None)
+        self._by_code[trade.contract.code].pop(trade.order.id, None)
+
+    def _index(self, trade: Trade) -> None:
+        self.version += 1
+        self._by_status[trade.status.status][trade.order.id] = trade
+        self._by_code[trade.contract.code][trade.order.id] = trade
+
+    def add(self, trade: Trade) -> None:
+        existing = self._trades.get(trade.order.id)
+        if existing is not None:
+            self._unindex(existing)
+
+        self._trades[trade.order.id] = trade
+        self._index(trade)
+
+    def set_status(self, trade_id: str, status: sjc.Status) -> None:
+        trade = self._trades.get(trade_id)
+        if trade is None or trade.status.status == status:
+            return
+
+        self._unindex(trade)
+        trade.status.status = status
+        self._index(trade)
+
+    def replace(self, trades: Iterable[Trade]) -> None:
+        """Replace the whole book with a fresh `list_trades` result."""
+        old_statuses = {trade_id: t.status.status for trade_id, t in self._trades.items()}
+
+        self._trades.clear()
+        self._by_status.clear()
+        self._by_code.clear()
+        for trade in trades:
+            self.add(trade)
+
+        drift = sum(
+            trade_id in old_statuses and old_statuses[trade_id] != t.status.status
+            for trade_id, t in self._trades.items()
+        )
+        if drift:
+            logger.info(f"Trade book reconciliation corrected {drift} trades")
+
+    def on_order_event(self, state: sjc.OrderState, msg: dict[str, Any]) -> None:
+        """Apply a shioaji order or deal event, must be called on the event loop."""
+        if state == sjc.OrderState.StockOrder:
+            self._on_stock_order(msg)
+        elif state == sjc.OrderState.StockDeal:
+            self._on_stock_deal(msg)
+
+    def _on_stock_order(self, msg: dict[str, Any]) -> None:
+        trade_id = msg["order"]["id"]
+        operation = msg["operation"]
+        trade = self._trades.get(trade_id)
+        if trade is None:
+            # Orders from other clients show up on the next reconciliation
+            logger.debug(f"Order event for unknown trade {trade_id}: {operation}")
+            return
+
+        if operation["op_code"] != "00":
+            logger.warning(f"Order operation failed for trade {trade_id}: {operation}")
+            if operation["op_type"] == "New":
+                self.set_status(trade_id, sjc.Status.Failed)
+            return
+
+        status = msg.get("status", {})
+        if operation["op_type"] == "Cancel":
+            trade.status.cancel_quantity = status.get("cancel_quantity", trade.order.quantity)
+            self.set_status(trade_id, sjc.Status.Cancelled)
+        elif operation["op_type"] == "UpdatePrice":
+            trade.status.modified_price = status.get("modified_price", trade.order.price)
+        elif operation["op_type"] == "UpdateQty":
+            trade.status.cancel_quantity = status.get("cancel_quantity", 0)
+
+    def _on_stock_deal(self, msg: dict[str, Any]) -> None:
+        trade_id = msg["trade_id"]
+        trade = self._trades.get(trade_id)
+        if trade is None:
+            logger.debug(f"Deal event for unknown trade {trade_id}")
+            return
+
+        trade.status.deal_quantity += msg["quantity"]
+        remaining = trade.order.quantity - trade.status.cancel_quantity
+        self.set_status(
+            trade_id,
+            sjc.Status.Filled if trade.status.deal_quantity >= remaining else sjc.Status.PartFilled,
+        )
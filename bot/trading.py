@@ -0,0 +1,399 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import functools
+import statistics
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol
+
+import discord
+import shioaji.constant as sjc
+from discord.ext import tasks
+from loguru import logger
+
+from bot.config import CONFIG
+from bot.constants import UTC8
+from bot.db.models.order import Order
+from bot.db.models.placement import Placement
+from bot.db.models.trade_event import TRADE_EVENTS, TradeEvent, TradeEventKind
+from bot.db.models.trigger import Trigger
+from bot.metrics import REGISTRY
+from bot.placement import PlacementBatch, PlacementEngine, PreparedOrder, prepare_order
+from bot.price_rules import PriceIssue, check_prices
+from bot.quotes import QuoteService
+from bot.shioaji import AsyncShioaji, SessionPool, ShioajiSession, get_executor
+from bot.sim import SimMarket, SimShioaji
+from bot.trading_calendar import TradingCalendar
+from bot.triggers import TriggerWatcher
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from bot.contracts import ContractCatalog
+    from bot.db.models.trigger import TriggerKind
+    from bot.placement import PlacementResult
+    from bot.price_rules import PriceCheck
+    from bot.quotes import Quote
+    from bot.trade_book import TradeBook
+
+PLACE_TIMES = sorted(t.replace(tzinfo=UTC8) for t in CONFIG.place_times)
+PREPARE_TIMES = [
+    (
+        datetime.datetime.combine(datetime.date(2000, 1, 2), t)
+        - datetime.timedelta(seconds=CONFIG.prepare_lead)
+    ).timetz()
+    for t in PLACE_TIMES
+]
+
+
+class Trader(Protocol):
+    """The trading commands the Discord bot needs, served in or out of process."""
+
+    async def start(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def create_order(
+        self, *, account: str, stock_id: str, price: float, quantity: int
+    ) -> Order | None:
+        """Create or overwrite a long-term order, None if the stock does not exist."""
+        ...
+
+    async def create_trigger(  # noqa: PLR0913
+        self,
+        *,
+        account: str,
+        stock_id: str,
+        price: float,
+        quantity: int,
+        kind: TriggerKind,
+        threshold: float,
+    ) -> Trigger | None:
+        """Create an order sent once quotes cross `threshold`, None if the stock does not exist."""
+        ...
+
+    async def cancel_trade(self, *, account: str, trade_id: str) -> bool:
+        """Cancel a pre-submitted trade, False if the trade is unknown."""
+        ...
+
+    async def trade_book(self, *, account: str) -> TradeBook: ...
+
+    async def place_now(self) -> int:
+        """Send the long-term orders of every account immediately, return how many were placed."""
+        ...
+
+    async def quotes(self, codes: list[str]) -> dict[str, Quote]:
+        """Return the last prices of stocks, batched into as few broker calls as possible."""
+        ...
+
+    async def get_catalog(self) -> ContractCatalog: ...
+
+
+def create_pool(catalog: ContractCatalog) -> SessionPool:
+    api_factory = (
+        functools.partial(SimShioaji, market=SimMarket()) if CONFIG.sim_broker else AsyncShioaji
+    )
+    return SessionPool(catalog, CONFIG.all_accounts(), api_factory=api_factory)
+
+
+class AccountEngine:
+    """Places the orders of one account through that account's broker session.
+
+    Every account has its own `PlacementEngine`, so its rate limit and circuit breaker do
+    not slow down or trip for the other accounts.
+    """
+
+    def __init__(self, session: ShioajiSession) -> None:
+        self.session = session
+        self.account = session.account.name
+        self.placement = PlacementEngine(
+            workers=CONFIG.order_workers,
+            rate_limit=session.account.order_rate_limit or CONFIG.order_rate_limit,
+        )
+        self.triggers = TriggerWatcher(session, self.placement)
+        self.api: AsyncShioaji | None = None
+
+    async def start(self) -> None:
+        await self.triggers.start()
+
+    async def close(self) -> None:
+        await self.triggers.close()
+
+    async def prepare(self, target: datetime.datetime) -> PlacementBatch:
+        """Login, snapshot the account and build every order that should be sent at `target`."""
+        api = self.api = await self.session.get()
+        if not CONFIG.simulation:
+            positions = await self.session.positions()
+            position_ids = {p.code for p in positions}
+        else:
+            position_ids = {}
+        logger.info(f"Position IDs of {self.account!r}: {position_ids}")
+
+        await self.session.reconcile_trades()
+        trade_stocks_ids = self.session.trades.codes_with_status(sjc.Status.PreSubmitted)
+
+        orders = await Order.all(self.account)
+        # Check the whole book locally, a price the broker would reject costs a round trip
+        # and a rate limit slot in the critical window
+        checks = check_prices(self.session.catalog, [(o.stock_id, o.price) for o in orders])
+        prepared: list[PreparedOrder] = []
+        held: list[str] = []
+        for o, check in zip(orders, checks, strict=True):
+            logger.info(f"Processing order: {o}")
+
+            if o.stock_id in trade_stocks_ids:
+                logger.info(f"Order {o.stock_id} already in pre-submitted trades, skipping order")
+                continue
+
+            if o.stock_id in position_ids:
+                logger.info(f"Order {o.stock_id} already in positions, skipping and deleting order")
+                held.append(o.stock_id)
+                continue
+
+            if check.issue in {PriceIssue.BELOW_LIMIT_DOWN, PriceIssue.ABOVE_LIMIT_UP}:
+                # A long-term order waits for a day when its price is within the limits
+                logger.info(
+                    f"Order {o.stock_id} price {o.price} is outside today's limits "
+                    f"{check.limit_down} to {check.limit_up}, skipping order"
+                )
+                continue
+
+            if not check.sendable:
+                # Never send a price other than the one the user set, reject the order instead
+                self._reject(o, check)
+                continue
+
+            prepared_order = prepare_order(api, o)
+            if prepared_order is not None:
+                prepared.append(prepared_order)
+
+        await Order.delete_many(self.account, held)
+        logger.info(f"Prepared {len(prepared)} orders of {self.account!r} for {target}")
+        return PlacementBatch(target=target, orders=prepared)
+
+    def _reject(self, order: Order, check: PriceCheck) -> None:
+        if check.issue == PriceIssue.OFF_TICK:
+            reason = (
+                f"price {order.price} is off tick {check.tick}, "
+                f"the nearest valid price is {check.snapped}"
+            )
+        else:
+            reason = "stock is not in the contract catalog"
+        logger.warning(f"Order {order.stock_id} of {self.account!r} not sent, {reason}")
+        TradeEvent.record(
+            account=self.account,
+            kind=TradeEventKind.FAILED,
+            stock_id=order.stock_id,
+            trade_id=None,
+            price=order.price,
+            quantity=order.quantity,
+            detail=reason,
+        )
+
+    async def fire(self, batch: PlacementBatch) -> list[PlacementResult]:
+        """Send a prepared batch, the session is only re-fetched if it went stale meanwhile.
+
+        Orders are claimed in the placement journal first, so orders that another run
+        already sent for the same trading date are skipped.
+        """
+        api = await self.session.get()
+        if api is not self.api:
+            logger.warning("Shioaji session was renewed after preparing, rebuilding orders")
+            batch = PlacementBatch(
+                target=batch.target,
+                orders=[p for o in batch.orders if (p := prepare_order(api, o.order)) is not None],
+            )
+
+        trading_date = batch.target.date()
+        claimed = await Placement.claim_many(
+            self.account, [o.order.stock_id for o in batch.orders], trading_date
+        )
+        orders = [o for o in batch.orders if o.order.stock_id in claimed]
+        if len(orders) < len(batch.orders):
+            logger.info(
+                f"Skipping {len(batch.orders) - len(orders)} orders already placed on {trading_date}"
+            )
+
+        results = await self.placement.run(api, orders)
+        self.session.invalidate()
+        for r in results:
+            if r.trade is not None:
+                self.session.trades.add(r.trade)
+        await Placement.finish_many(self.account, trading_date, results)
+        TradeEvent.record_placements(self.account, results)
+        self._report_delays(batch.target, results)
+        return results
+
+    def _report_delays(self, target: datetime.datetime, results: Sequence[PlacementResult]) -> None:
+        if not results:
+            return
+
+        delays = sorted(r.sent_at - target.timestamp() for r in results)
+        for r in results:
+            logger.debug(
+                f"Order {r.order.stock_id} sent {r.sent_at - target.timestamp():.3f}s after target"
+            )
+        logger.info(
+            f"Orders of {self.account!r} sent {delays[0]:.3f}s to {delays[-1]:.3f}s after "
+            f"{target} (median {statistics.median(delays):.3f}s)"
+        )
+
+    async def create_trigger(
+        self, *, stock_id: str, price: float, quantity: int, kind: TriggerKind, threshold: float
+    ) -> Trigger:
+        trigger = await Trigger.create(
+            account=self.account,
+            stock_id=stock_id,
+            price=price,
+            quantity=quantity,
+            kind=kind,
+            threshold=threshold,
+        )
+        await self.triggers.add(trigger)
+        logger.info(f"Created trigger: {trigger}")
+        return trigger
+
+    async def cancel_trade(self, trade_id: str) -> bool:
+        trade = self.session.trades.get(trade_id)
+        if trade is None:
+            return False
+
+        api = await self.session.get()
+        await api.cancel_order(trade)
+        self.session.invalidate()
+        self.session.trades.set_status(trade_id, sjc.Status.Cancelled)
+        return True
+
+
+class TradingEngine:
+    """Owns the broker sessions and sends the long-term orders at `PLACE_TIMES` on trading days.
+
+    Every configured account gets an `AccountEngine`, and scheduled runs prepare and send
+    the orders of all accounts in parallel. Price-triggered orders are sent whenever the
+    quotes cross them. The engine runs inside the bot by default. Run `run_engine.py`
+    with `engine_socket` set to move it into its own process, so that order timing is
+    isolated from Discord.
+    """
+
+    def __init__(self, pool: SessionPool) -> None:
+        self.pool = pool
+        self.calendar = TradingCalendar.load(Path(CONFIG.trading_calendar_path))
+        self.accounts = {session.account.name: AccountEngine(session) for session in pool}
+        # Quotes are market data, any account's session can fetch them
+        self.quote_service = QuoteService(next(iter(pool)))
+
+    def __getitem__(self, account: str) -> AccountEngine:
+        engine = self.accounts.get(account)
+        if engine is None:
+            msg = f"Unknown account {account!r}"
+            raise KeyError(msg)
+        return engine
+
+    async def start(self) -> None:
+        await TRADE_EVENTS.start()
+        # Connect to the broker in the background
+        await self.pool.start()
+        for engine in self.accounts.values():
+            await engine.start()
+        self.place_orders.start()
+
+    async def close(self) -> None:
+        self.place_orders.cancel()
+        for engine in self.accounts.values():
+            await engine.close()
+        await self.pool.close()
+        await TRADE_EVENTS.close()
+        get_executor().shutdown()
+
+    async def _run(self, target: datetime.datetime, *, wait: bool) -> list[PlacementResult]:
+        """Prepare and send the orders of every account, an account failing skips only its own."""
+
+        async def run_account(engine: AccountEngine) -> list[PlacementResult]:
+            try:
+                batch = await engine.prepare(target)
+                if wait:
+                    await discord.utils.sleep_until(target)
+                return await engine.fire(batch)
+            except Exception:
+                logger.exception(f"Failed to place the orders of {engine.account!r}")
+                return []
+
+        results = await asyncio.gather(*(run_account(e) for e in self.accounts.values()))
+        return [r for account_results in results for r in account_results]
+
+    @tasks.loop(time=PREPARE_TIMES)
+    async def place_orders(self) -> None:
+        now = datetime.datetime.now(UTC8)
+        # The loop wakes `prepare_lead` before a place time, which may fall on the next day
+        expected = now + datetime.timedelta(seconds=CONFIG.prepare_lead)
+        target = max(
+            now,
+            min(
+                (
+                    datetime.datetime.combine(expected.date() + datetime.timedelta(days=d), t)
+                    for d in (-1, 0, 1)
+                    for t in PLACE_TIMES
+                ),
+                key=lambda place_at: abs(place_at - expected),
+            ),
+        )
+        if not self.calendar.is_trading_day(target.date()):
+            logger.info(f"Market is closed on {target.date()}, not placing orders")
+            return
+
+        logger.info("Place orders task started")
+        await self._run(target, wait=True)
+        logger.info(f"Metrics after scheduled run:\n{REGISTRY.summary()}")
+
+    async def place_now(self) -> int:
+        results = await self._run(datetime.datetime.now(UTC8), wait=False)
+        return sum(r.trade is not None for r in results)
+
+    async def create_order(
+        self, *, account: str, stock_id: str, price: float, quantity: int
+    ) -> Order | None:
+        if account not in self.accounts:
+            msg = f"Unknown account {account!r}"
+            raise KeyError(msg)
+
+        catalog = await self.pool.get_catalog()
+        if stock_id not in catalog:
+            return None
+
+        order = await Order.upsert(
+            account=account, stock_id=stock_id, price=price, quantity=quantity
+        )
+        logger.info(f"Upserted order: {order}")
+        return order
+
+    async def create_trigger(  # noqa: PLR0913
+        self,
+        *,
+        account: str,
+        stock_id: str,
+        price: float,
+        quantity: int,
+        kind: TriggerKind,
+        threshold: float,
+    ) -> Trigger | None:
+        engine = self[account]
+        catalog = await self.pool.get_catalog()
+        if stock_id not in catalog:
+            return None
+
+        return await engine.create_trigger(
+            stock_id=stock_id, price=price, quantity=quantity, kind=kind, threshold=threshold
+        )
+
+    async def cancel_trade(self, *, account: str, trade_id: str) -> bool:
+        return await self[account].cancel_trade(trade_id)
+
+    async def trade_book(self, *, account: str) -> TradeBook:
+        return await self.pool[account].reconcile_trades()
+
+    async def quotes(self, codes: list[str]) -> dict[str, Quote]:
+        return await self.quote_service.get_many(codes)
+
+    async def get_catalog(self) -> ContractCatalog:
+        return await self.pool.get_catalog()
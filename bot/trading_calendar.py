@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import csv
+import datetime
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+SATURDAY = 5
+
+
+class TradingCalendar:
+    """The days the Taiwan Stock Exchange is open, weekdays minus the market holidays.
+
+    Only the years that appear in the holiday list are known. Other years fall back to
+    treating every weekday as a trading day, with a warning.
+    """
+
+    def __init__(self, holidays: Iterable[datetime.date]) -> None:
+        self._holidays = frozenset(day.toordinal() for day in holidays)
+        self._years = frozenset(datetime.date.fromordinal(d).year for d in self._holidays)
+        self._warned: set[int] = set()
+
+    @classmethod
+    def load(cls, path: Path) -> TradingCalendar:
+        """Load a CSV file with a `date` column of ISO dates, lines starting with # are skipped."""
+        with path.open(encoding="utf-8", newline="") as f:
+            rows = csv.DictReader(line for line in f if not line.startswith("#"))
+            calendar = cls(datetime.date.fromisoformat(row["date"]) for row in rows)
+
+        logger.info(
+            f"Loaded {len(calendar._holidays)} market holidays for "
+            f"{', '.join(map(str, sorted(calendar._years)))} from {path}"
+        )
+        return calendar
+
+    def is_trading_day(self, day: datetime.date) -> bool:
+        if day.weekday() >= SATURDAY:
+            return False
+
+        if day.year not in self._years and day.year not in self._warned:
+            self._warned.add(day.year)
+            logger.warning(f"No market holidays known for {day.year}, assuming weekdays are open")
+        return day.toordinal() not in self._holidays
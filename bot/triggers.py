@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import contextlib
+from array import array
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.config import CONFIG
+from bot.db.models.order import Order
+from bot.db.models.trade_event import TradeEvent
+from bot.db.models.trigger import Trigger
+from bot.placement import prepare_order
+
+if TYPE_CHECKING:
+    import datetime
+    from collections.abc import Sequence
+
+    import shioaji.constant as sjc
+    from shioaji.stream_data_type import TickSTKv1
+
+    from bot.placement import PlacementEngine, PlacementResult
+    from bot.shioaji import AsyncShioaji, ShioajiSession
+
+
+class TriggerIndex:
+    """Armed triggers grouped by stock, each group sorted by trigger price.
+
+    A tick at `price` fires every trigger of its stock whose trigger price is at least
+    `price`, which is a suffix of the sorted group found with one binary search. Prices
+    and IDs are kept in typed arrays, so each armed trigger costs 16 bytes.
+    """
+
+    def __init__(self) -> None:
+        self._prices: dict[str, array[float]] = {}
+        self._ids: dict[str, array[int]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    def codes(self) -> list[str]:
+        return list(self._prices)
+
+    def highest(self, code: str) -> float | None:
+        """Return the highest price that fires a trigger of `code`, None if there is none."""
+        prices = self._prices.get(code)
+        return prices[-1] if prices else None
+
+    def add(self, code: str, trigger_price: float, trigger_id: int) -> None:
+        prices = self._prices.setdefault(code, array("d"))
+        ids = self._ids.setdefault(code, array("q"))
+        index = bisect.bisect_right(prices, trigger_price)
+        prices.insert(index, trigger_price)
+        ids.insert(index, trigger_id)
+
+    def fire(self, code: str, price: float) -> list[int]:
+        """Remove and return the IDs of the triggers that a tick at `price` fires."""
+        prices = self._prices.get(code)
+        if prices is None:
+            return []
+
+        index = bisect.bisect_left(prices, price)
+        fired = self._ids[code][index:].tolist()
+        if index == 0:
+            del self._prices[code], self._ids[code]
+        else:
+            del prices[index:], self._ids[code][index:]
+        return fired
+
+
+class TriggerWatcher:
+    """Sends price-triggered orders as soon as a streamed tick crosses their threshold.
+
+    Active triggers are loaded into a `TriggerIndex` and their stocks are subscribed to
+    tick quotes, at most `CONFIG.max_watched_symbols` of them. The SDK delivers ticks on
+    its own thread, where a tick is dropped unless it is at or below the highest trigger
+    price of its stock, so only ticks that fire something reach the event loop.
+
+    The index is rebuilt whenever the session reconnects or the contract catalog is
+    rebuilt, since percentage triggers depend on the day's reference price.
+    """
+
+    def __init__(
+        self, session: ShioajiSession, placement: PlacementEngine, *, interval: float = 60.0
+    ) -> None:
+        self.session = session
+        self.placement = placement
+        self.interval = interval
+        self.index = TriggerIndex()
+
+        self._triggers: dict[int, Trigger] = {}
+        self._highest: dict[str, float] = {}
+        """Copy of `TriggerIndex.highest` per stock, read from the SDK's thread."""
+        self._subscribed: set[str] = set()
+        self._api: AsyncShioaji | None = None
+        self._armed_for: datetime.datetime | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._firing: set[asyncio.Task[None]] = set()
+
+    def _arm_one(self, trigger: Trigger) -> None:
+        assert trigger.id is not None
+        entry = self.session.catalog.get(trigger.stock_id)
+        if entry is None:
+            logger.warning(f"Trigger {trigger.id} watches unknown stock {trigger.stock_id}")
+            return
+
+        trigger_price = trigger.trigger_price(entry.reference)
+        self._triggers[trigger.id] = trigger
+        self.index.add(trigger.stock_id, trigger_price, trigger.id)
+        self._highest[trigger.stock_id] = max(
+            self._highest.get(trigger.stock_id, trigger_price), trigger_price
+        )
+
+    async def arm(self) -> None:
+        """Load every active trigger and subscribe to the quotes of their stocks."""
+        api = await self.session.get()
+        triggers = await Trigger.active(self.session.account.name)
+
+        self.index = TriggerIndex()
+        self._triggers.clear()
+        self._highest.clear()
+        for trigger in triggers:
+            self._arm_one(trigger)
+        self._armed_for = self.session.catalog.built_at
+
+        await self._subscribe(api)
+        logger.info(
+            f"Armed {len(self.index)} triggers on {len(self._subscribed)} subscribed stocks"
+        )
+
+    async def add(self, trigger: Trigger) -> None:
+        """Start watching a newly created trigger."""
+        self._arm_one(trigger)
+        if self._api is not None:
+            await self._subscribe(self._api)
+
+    async def _subscribe(self, api: AsyncShioaji) -> None:
+        if api is not self._api:
+            # Subscriptions do not survive a new session
+            self._api = api
+            self._subscribed = set()
+            api.set_tick_callback(self._on_tick)
+
+        codes = self.index.codes()
+        if len(codes) > CONFIG.max_watched_symbols:
+            logger.warning(
+                f"Triggers watch {len(codes)} stocks, only the first "
+                f"{CONFIG.max_watched_symbols} are subscribed"
+            )
+        wanted = set(sorted(codes)[: CONFIG.max_watched_symbols])
+
+        for code in self._subscribed - wanted:
+            contract = api.get_stock(code)
+            if contract is not None:
+                await api.unsubscribe_ticks(contract)
+            self._subscribed.discard(code)
+        for code in wanted - self._subscribed:
+            contract = api.get_stock(code)
+            if contract is not None:
+                await api.subscribe_ticks(contract)
+                self._subscribed.add(code)
+
+    def _on_tick(self, _: sjc.Exchange, tick: TickSTKv1) -> None:
+        # Called from the SDK's thread for every tick, keep it cheap
+        highest = self._highest.get(tick.code)
+        if highest is not None and tick.close <= highest and self._loop is not None:
+            self._loop.call_soon_threadsafe(self.on_tick, tick.code, float(tick.close))
+
+    def on_tick(self, code: str, price: float) -> None:
+        """Fire the triggers of `code` that a tick at `price` crosses."""
+        fired = self.index.fire(code, price)
+        if not fired:
+            return
+
+        highest = self.index.highest(code)
+        if highest is None:
+            self._highest.pop(code, None)
+        else:
+            self._highest[code] = highest
+
+        logger.info(f"Tick {code} at {price} fired triggers {fired}")
+        task = asyncio.create_task(self._fire([self._triggers.pop(i) for i in fired]))
+        self._firing.add(task)
+        task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, triggers: Sequence[Trigger]) -> None:
+        claimed: set[int] = set()
+        try:
+            api = await self.session.get()
+            prepared = {
+                t.id: p
+                for t in triggers
+                if (
+                    p := prepare_order(
+                        api,
+                        Order(
+                            account=t.account,
+                            stock_id=t.stock_id,
+                            price=t.price,
+                            quantity=t.quantity,
+                        ),
+                    )
+                )
+                is not None
+            }
+            claimed = await Trigger.claim_many(list(prepared))  # pyright: ignore[reportArgumentType]
+            results = await self.placement.run(
+                api, [p for trigger_id, p in prepared.items() if trigger_id in claimed]
+            )
+        except Exception:
+            logger.exception(f"Failed to fire triggers {[t.id for t in triggers]}, re-arming them")
+            try:
+                # Claimed rows would make every later tick claim nothing
+                await Trigger.release_many(list(claimed))
+            except Exception:
+                logger.exception(f"Failed to release triggers {sorted(claimed)}")
+            # Claiming is atomic, so a trigger that did fire is not sent twice when re-armed
+            for t in triggers:
+                self._arm_one(t)
+            return
+
+        self.session.invalidate()
+        by_order = {id(p.order): trigger_id for trigger_id, p in prepared.items()}
+        finished: dict[int, PlacementResult] = {}
+        for r in results:
+            finished[by_order[id(r.order)]] = r
+            if r.trade is not None:
+                self.session.trades.add(r.trade)
+        await Trigger.finish_many(finished)
+        TradeEvent.record_placements(self.session.account.name, results)
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                api = await self.session.get()
+                if api is not self._api or self.session.catalog.built_at != self._armed_for:
+                    await self.arm()
+            except Exception:
+                logger.exception("Failed to arm price triggers")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._firing:
+            await asyncio.gather(*self._firing, return_exceptions=True)
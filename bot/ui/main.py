@@ -3,14 +3,15 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Any
 
 import discord
-import shioaji.constant as sjc
 from discord import ui
 from loguru import logger
 
-from bot.db.models.order import Order
-from bot.shioaji import AsyncShioaji
-from bot.ui.order import OrderManageView, OrderModal, OrderSelect
-from bot.ui.trade import TradeManageView, TradeSelect
+from bot.config import CONFIG
+from bot.metrics import handler
+from bot.price_rules import PriceIssue, check_price
+from bot.ui.order import OrderManageView, OrderModal
+from bot.ui.trade import TradeManageView
+from bot.utils import get_stock_name
 
 if TYPE_CHECKING:
     from bot.types import Interaction
@@ -20,8 +21,22 @@ class MainView(ui.View):
     def __init__(self) -> None:
         super().__init__(timeout=None)
 
+    async def interaction_check(self, i: Interaction) -> bool:
+        if CONFIG.account_for(i.user.id) is None:
+            await i.response.send_message("你沒有綁定任何帳戶", ephemeral=True)
+            return False
+        return True
+
+    @staticmethod
+    def account(i: Interaction) -> str:
+        """Return the account of the user who pressed a button, after `interaction_check`."""
+        account = CONFIG.account_for(i.user.id)
+        assert account is not None
+        return account.name
+
     @ui.button(label="下長效單", style=discord.ButtonStyle.primary, custom_id="order_long")
-    async def place_order(self, i: Interaction, _: ui.Button) -> Any:
+    @handler("main.place_order")
+    async def place_order(self, i: Interaction, _: ui.Button) -> Any:  # noqa: PLR0911
         modal = OrderModal(title="填寫下單資訊")
         await i.response.send_modal(modal)
 
@@ -54,59 +69,64 @@ class MainView(ui.View):
 
         logger.info(f"Recieved modal values: {stock_id=}, {price=}, {quantity=}")
 
-        async with AsyncShioaji() as api:
-            stock = api.get_stock(stock_id)
+        trader = await i.client.get_trader()
+        catalog = await trader.get_catalog()
+        check = check_price(catalog, stock_id, price)
+        if check.issue == PriceIssue.OFF_TICK:
+            await i.followup.send(
+                f"價格 {price} 不符合升降單位 {check.tick}, 最接近的價格為 {check.snapped}",
+                ephemeral=True,
+            )
+            return
 
-        if stock is None:
+        order = await trader.create_order(
+            account=self.account(i), stock_id=stock_id, price=price, quantity=quantity
+        )
+        if order is None:
             await i.followup.send(f"找不到代號為 {stock_id} 的股票", ephemeral=True)
             return
 
-        existing = await Order.get_or_none(stock_id)
-        if existing is not None:
-            order = await Order.update(stock_id, price=price, quantity=quantity)
-            logger.info(f"Updated order: {order}")
-        else:
-            order = await Order.create(stock_id=stock_id, price=price, quantity=quantity)
-            logger.info(f"Created order: {order}")
-
         embed = discord.Embed(title="下單成功", color=discord.Color.green())
-        embed.add_field(name="股票", value=f"[{stock.code}] {stock.name}")
+        embed.add_field(name="股票", value=f"[{stock_id}] {get_stock_name(stock_id, catalog)}")
         embed.add_field(name="價格", value=str(order.price))
         embed.add_field(name="數量", value=str(order.quantity))
+        if not check.sendable:
+            embed.add_field(
+                name="注意",
+                value=f"價格超出今日跌停 {check.limit_down} 至漲停 {check.limit_up}, 今日不會送出",
+                inline=False,
+            )
 
         await i.followup.send(embed=embed, ephemeral=True)
 
     @ui.button(label="查看所有長效單", style=discord.ButtonStyle.secondary, custom_id="view_orders")
+    @handler("main.view_orders")
     async def view_orders(self, i: Interaction, _: ui.Button) -> Any:
         await i.response.send_message(content="稍等, 正在獲取長效單", ephemeral=True)
 
-        orders = await Order.all()
-        if not orders:
+        trader = await i.client.get_trader()
+        catalog = await trader.get_catalog()
+        view = OrderManageView(catalog, self.account(i), trader.quotes)
+        await view.load()
+        if view.selected is None:
             await i.edit_original_response(content="目前沒有任何長效單")
             return
 
-        async with AsyncShioaji() as api:
-            view = OrderManageView(orders, api.Contracts.Stocks)
-            await i.edit_original_response(
-                embed=OrderSelect.get_embed(view.order, api.Contracts.Stocks),
-                view=view,
-                content=None,
-            )
+        await i.edit_original_response(**view.render())
 
     @ui.button(label="查看所有預約單", style=discord.ButtonStyle.secondary, custom_id="view_trades")
+    @handler("main.view_trades")
     async def view_trades(self, i: Interaction, _: ui.Button) -> Any:
         await i.response.send_message(content="稍等, 正在獲取預約單", ephemeral=True)
 
-        async with AsyncShioaji() as api:
-            await api.update_status()
-
-        trades = await api.list_trades()
-        trades = [t for t in trades if t.status.status == sjc.Status.PreSubmitted]
-        if not trades:
+        account = self.account(i)
+        trader = await i.client.get_trader()
+        book = await trader.trade_book(account=account)
+        catalog = await trader.get_catalog()
+        view = TradeManageView(book, catalog, account, trader.quotes)
+        await view.load()
+        if view.selected is None:
             await i.edit_original_response(content="目前沒有任何預約單")
             return
 
-        view = TradeManageView(trades, api.Contracts.Stocks)
-        await i.edit_original_response(
-            embed=TradeSelect.get_embed(view.trade, api.Contracts.Stocks), view=view, content=None
-        )
+        await i.edit_original_response(**view.render())
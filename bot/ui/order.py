@@ -5,21 +5,26 @@ from typing import TYPE_CHECKING, Any
 import discord
 from discord import ui
 
+from bot.config import CONFIG
+from bot.db.models.order import ORDER_CACHE, Order
+from bot.metrics import handler
+from bot.ui.pager import PagedView, add_quote_fields, quote_description
 from bot.utils import get_stock_name
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Hashable, Sequence
+    from types import EllipsisType
 
-    from shioaji.contracts import StreamStockContracts
-
-    from bot.db.models.order import Order
+    from bot.contracts import ContractCatalog
+    from bot.quotes import Quote
     from bot.types import Interaction
+    from bot.ui.pager import QuoteSource
 
 
 class OrderModal(ui.Modal):
     stock_id = ui.TextInput(label="股票代號", placeholder="2330", max_length=5)
-    price = ui.TextInput(label="價格", placeholder="28.3", max_length=5)
-    quantity = ui.TextInput(label="數量", placeholder="1", max_length=2, default="1")
+    price = ui.TextInput(label="價格", placeholder="28.3", max_length=8)
+    quantity = ui.TextInput(label="數量", placeholder="1", max_length=4, default="1")
 
     async def on_submit(self, i: Interaction) -> Any:
         await i.response.defer()
@@ -28,74 +33,81 @@ class OrderModal(ui.Modal):
 
 class OrderDeleteConfirmView(ui.View):
     def __init__(self, order: Order) -> None:
-        super().__init__(timeout=None)
+        super().__init__(timeout=CONFIG.view_timeout)
         self.order = order
 
     @ui.button(label="確認刪除", style=discord.ButtonStyle.danger, custom_id="confirm_delete")
+    @handler("order.confirm_delete")
     async def confirm_delete(self, i: Interaction, _: ui.Button) -> Any:
         await i.response.defer()
         await self.order.delete()
         await i.edit_original_response(content="長效單已刪除", view=None)
 
     @ui.button(label="取消", style=discord.ButtonStyle.secondary, custom_id="cancel_delete")
+    @handler("order.cancel_delete")
     async def cancel_delete(self, i: Interaction, _: ui.Button) -> Any:
         await i.response.edit_message(content="已取消", view=None, embed=None)
 
 
-class OrderManageView(ui.View):
-    def __init__(self, orders: Sequence[Order], stocks: StreamStockContracts) -> None:
-        super().__init__(timeout=None)
-        self.order = orders[0]
-        self.stock_names = stocks
+class OrderManageView(PagedView["Order"]):
+    name = "order"
+    placeholder = "選擇一個長效單"
+    empty_message = "沒有符合的長效單"
+
+    def __init__(
+        self,
+        catalog: ContractCatalog,
+        account: str,
+        quote_source: QuoteSource | None = None,
+        *,
+        timeout: float | EllipsisType | None = ...,
+        max_open_views: int | EllipsisType = ...,
+    ) -> None:
+        self.account = account
+        super().__init__(catalog, quote_source, timeout=timeout, max_open_views=max_open_views)
+
+    def version(self) -> int:
+        return ORDER_CACHE.version
+
+    async def fetch(self, after: Hashable | None, limit: int) -> Sequence[Order]:
+        return await Order.page(self.account, after=after, prefix=self.query, limit=limit)  # pyright: ignore[reportArgumentType]
+
+    def key(self, item: Order) -> str:
+        return item.stock_id
+
+    def code(self, item: Order) -> str:
+        return item.stock_id
+
+    def option(self, item: Order) -> discord.SelectOption:
+        return discord.SelectOption(
+            label=f"[{item.stock_id}] {get_stock_name(item.stock_id, self.catalog)}",
+            description=f"價格: {item.price}, 數量: {item.quantity}"
+            + quote_description(self.quotes.get(item.stock_id)),
+            value=item.stock_id,
+        )
 
-        self.add_item(OrderSelect(orders=orders, stocks=stocks))
+    def build_embed(self, item: Order) -> discord.Embed:
+        return get_order_embed(item, self.catalog, self.quotes.get(item.stock_id))
 
     @ui.button(label="刪除", style=discord.ButtonStyle.danger, custom_id="delete_order", row=1)
+    @handler("order.delete_order")
     async def delete_order(self, i: Interaction, _: ui.Button) -> Any:
-        view = OrderDeleteConfirmView(self.order)
-        await i.response.edit_message(content="你確定要刪除這個長效單嗎?", view=view)
-
-
-class OrderSelect(ui.Select):
-    def __init__(self, orders: Sequence[Order], stocks: StreamStockContracts) -> None:
-        super().__init__(
-            options=[
-                discord.SelectOption(
-                    label=f"[{o.stock_id}] {get_stock_name(o.stock_id, stocks)}",
-                    description=f"價格: {o.price}, 數量: {o.quantity}",
-                    value=o.stock_id,
-                    default=o.stock_id == orders[0].stock_id,
-                )
-                for o in orders
-            ],
-            placeholder="選擇一個長效單",
-            custom_id="order_select",
-        )
-        self.order_or_trades = orders
-        self.stocks = stocks
-
-    @staticmethod
-    def get_embed(order: Order, stocks: StreamStockContracts) -> discord.Embed:
-        embed = discord.Embed(title="長效單詳情", color=discord.Color.blue())
-        embed.add_field(
-            name="股票", value=f"[{order.stock_id}] {get_stock_name(order.stock_id, stocks)}"
-        )
-        embed.add_field(name="價格", value=str(order.price))
-        embed.add_field(name="數量", value=str(order.quantity))
-        return embed
-
-    async def callback(self, i: Interaction) -> Any:
-        self.view: OrderManageView
-        await i.response.defer()
-
-        for o in self.options:
-            o.default = o.value in self.values
-
-        order = next((o for o in self.order_or_trades if o.stock_id == self.values[0]), None)
-        if order is None:
+        if self.selected is None:
             await i.response.send_message("找不到該長效單", ephemeral=True)
             return
 
-        self.view.order = order
-        embed = self.get_embed(order, self.stocks)
-        await i.edit_original_response(embed=embed, view=self.view)
+        view = OrderDeleteConfirmView(self.selected)
+        await i.response.edit_message(content="你確定要刪除這個長效單嗎?", view=view)
+
+
+def get_order_embed(
+    order: Order, catalog: ContractCatalog, quote: Quote | None = None
+) -> discord.Embed:
+    embed = discord.Embed(title="長效單詳情", color=discord.Color.blue())
+    embed.add_field(
+        name="股票", value=f"[{order.stock_id}] {get_stock_name(order.stock_id, catalog)}"
+    )
+    embed.add_field(name="價格", value=str(order.price))
+    embed.add_field(name="數量", value=str(order.quantity))
+    add_quote_fields(embed, order.stock_id, order.price, quote, catalog)
+    return embed
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import abc
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, ClassVar, NamedTuple
+
+import discord
+from discord import ui
+
+from bot.config import CONFIG
+from bot.metrics import handler
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Hashable, Sequence
+    from types import EllipsisType
+
+    from bot.contracts import ContractCatalog
+    from bot.quotes import Quote
+    from bot.types import Interaction
+
+    type QuoteSource = Callable[[list[str]], Awaitable[dict[str, Quote]]]
+
+PAGE_SIZE = 25
+"""Items per page, Discord rejects a select with more than 25 options."""
+
+
+_OPEN_VIEWS: OrderedDict[int, PagedView[Any]] = OrderedDict()
+"""Open paged views from least to most recently used."""
+
+
+def add_quote_fields(
+    embed: discord.Embed, stock_id: str, price: float, quote: Quote | None, catalog: ContractCatalog
+) -> None:
+    """Add the last price of a stock, its distance from `price` and today's limits to an embed."""
+    if quote is not None:
+        embed.add_field(name="現價", value=f"{quote.close} ({quote.change_rate:+.2f}%)")
+        if quote.close:
+            embed.add_field(name="距現價", value=f"{(price / quote.close - 1) * 100:+.2f}%")
+    limits = catalog.limits(stock_id)
+    if limits is not None and limits[1]:
+        embed.add_field(name="跌停 / 漲停", value=f"{limits[0]} / {limits[1]}")
+
+
+def quote_description(quote: Quote | None) -> str:
+    """Return the select option description suffix of a quote, empty without one."""
+    return f", 現價: {quote.close} ({quote.change_rate:+.2f}%)" if quote is not None else ""
+
+
+class _Page[T](NamedTuple):
+    items: Sequence[T]
+    options: list[discord.SelectOption]
+    has_next: bool
+    quotes: dict[str, Quote]
+    quoted_at: float
+
+
+class SearchModal(ui.Modal):
+    query = ui.TextInput(label="股票代號", placeholder="留空顯示全部", required=False, max_length=6)
+
+    def __init__(self, default: str) -> None:
+        super().__init__(title="搜尋")
+        self.query.default = default
+        self.interaction: Interaction | None = None
+
+    async def on_submit(self, i: Interaction) -> Any:
+        await i.response.defer()
+        self.interaction = i
+        self.stop()
+
+
+class PageSelect(ui.Select["PagedView[Any]"]):
+    @handler("pager.select")
+    async def callback(self, i: Interaction) -> Any:
+        assert self.view is not None
+        self.view.select_key(self.values[0])
+        await i.response.edit_message(**self.view.render())
+
+
+class PagedView[T](ui.View, abc.ABC):
+    """A select over one page of items at a time, with previous, next and search buttons.
+
+    Pages are fetched with a cursor, the key of the last item on the previous page, so
+    only the visible page is ever loaded. Fetched pages and rendered embeds are cached
+    until `version` reports that the underlying data changed.
+
+    With a quote source, the last prices of a page's stocks are fetched in one batch when
+    the page is loaded, and again when it is shown after `quotes_ttl` seconds.
+
+    A view stops after `timeout` seconds of inactivity, and the least recently used view
+    is stopped once more than `max_open_views` are open, so views left open by users do
+    not accumulate over the bot's uptime. Both default to the settings of the same name.
+    """
+
+    name: ClassVar[str]
+    placeholder: ClassVar[str]
+    empty_message: ClassVar[str]
+
+    def __init__(
+        self,
+        catalog: ContractCatalog,
+        quote_source: QuoteSource | None = None,
+        *,
+        timeout: float | EllipsisType | None = ...,
+        max_open_views: int | EllipsisType = ...,
+    ) -> None:
+        super().__init__(timeout=timeout if timeout is not ... else CONFIG.view_timeout)
+        self.max_open_views = max_open_views if max_open_views is not ... else CONFIG.max_open_views
+        self.catalog = catalog
+        self.quote_source = quote_source
+        self.query = ""
+        self.items: Sequence[T] = []
+        self.selected: T | None = None
+        self.quotes: dict[str, Quote] = {}
+
+        self._cursors: list[Hashable | None] = [None]
+        self._version: int | None = None
+        self._pages: dict[tuple[str, Hashable | None], _Page[T]] = {}
+        self._embeds: dict[str, discord.Embed] = {}
+
+        self.select = PageSelect(placeholder=self.placeholder, custom_id=f"{self.name}_select")
+        self.add_item(self.select)
+        self._touch()
+
+    def _touch(self) -> None:
+        _OPEN_VIEWS[id(self)] = self
+        _OPEN_VIEWS.move_to_end(id(self))
+        while len(_OPEN_VIEWS) > self.max_open_views:
+            _, oldest = _OPEN_VIEWS.popitem(last=False)
+            oldest.stop()
+
+    def _release(self) -> None:
+        _OPEN_VIEWS.pop(id(self), None)
+        self.items = []
+        self.selected = None
+        self._pages.clear()
+        self._embeds.clear()
+
+    def stop(self) -> None:
+        super().stop()
+        self._release()
+
+    async def on_timeout(self) -> None:
+        self._release()
+
+    @abc.abstractmethod
+    def version(self) -> int:
+        """Return a number that changes whenever the underlying items change."""
+
+    @abc.abstractmethod
+    async def fetch(self, after: Hashable | None, limit: int) -> Sequence[T]:
+        """Fetch up to `limit` items matching `query` that come after the `after` cursor."""
+
+    @abc.abstractmethod
+    def key(self, item: T) -> str:
+        """Return the unique select option value of an item."""
+
+    @abc.abstractmethod
+    def code(self, item: T) -> str:
+        """Return the stock code of an item, whose quote is shown with it."""
+
+    def cursor(self, item: T) -> Hashable:
+        """Return the cursor that fetches the items after this one."""
+        return self.key(item)
+
+    @abc.abstractmethod
+    def option(self, item: T) -> discord.SelectOption:
+        """Return the select option of an item."""
+
+    @abc.abstractmethod
+    def build_embed(self, item: T) -> discord.Embed:
+        """Return the embed that shows an item."""
+
+    async def load(self) -> None:
+        """Load the page at the current cursor and select its first item."""
+        self._touch()
+        version = self.version()
+        if version != self._version:
+            self._pages.clear()
+            self._embeds.clear()
+            self._version = version
+
+        cache_key = (self.query, self._cursors[-1])
+        page = self._pages.get(cache_key)
+        if page is None:
+            items = await self.fetch(self._cursors[-1], PAGE_SIZE + 1)
+            page = self._pages[cache_key] = await self._build_page(
+                items[:PAGE_SIZE], has_next=len(items) > PAGE_SIZE
+            )
+        elif (
+            self.quote_source is not None and time.monotonic() - page.quoted_at > CONFIG.quotes_ttl
+        ):
+            for item in page.items:
+                self._embeds.pop(self.key(item), None)
+            page = self._pages[cache_key] = await self._build_page(
+                page.items, has_next=page.has_next
+            )
+        self.quotes = page.quotes
+
+        self.items = page.items
+        self.selected = page.items[0] if page.items else None
+        if page.options:
+            self.select.options = page.options
+            self.select.disabled = False
+        else:
+            self.select.options = [discord.SelectOption(label="沒有符合的結果", value="-")]
+            self.select.disabled = True
+        self._mark_selected()
+
+        self.previous_page.disabled = len(self._cursors) == 1
+        self.next_page.disabled = not page.has_next
+
+    async def _build_page(self, items: Sequence[T], *, has_next: bool) -> _Page[T]:
+        # One batched broker call for every stock on the page
+        quoted_at = time.monotonic()
+        self.quotes = (
+            await self.quote_source(list({self.code(item) for item in items}))
+            if self.quote_source is not None and items
+            else {}
+        )
+        return _Page(items, [self.option(item) for item in items], has_next, self.quotes, quoted_at)
+
+    def select_key(self, key: str) -> None:
+        self._touch()
+        self.selected = next((item for item in self.items if self.key(item) == key), None)
+        self._mark_selected()
+
+    def _mark_selected(self) -> None:
+        selected_key = self.key(self.selected) if self.selected is not None else None
+        for option in self.select.options:
+            option.default = option.value == selected_key
+
+    def embed(self) -> discord.Embed | None:
+        if self.selected is None:
+            return None
+
+        key = self.key(self.selected)
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = self._embeds[key] = self.build_embed(self.selected)
+        return embed
+
+    def render(self) -> dict[str, Any]:
+        """Return the message fields that display the current page."""
+        embed = self.embed()
+        return {"content": None if embed else self.empty_message, "embed": embed, "view": self}
+
+    @ui.button(
+        label="上一頁", style=discord.ButtonStyle.secondary, custom_id="previous_page", row=2
+    )
+    @handler("pager.previous_page")
+    async def previous_page(self, i: Interaction, _: ui.Button) -> Any:
+        if len(self._cursors) > 1:
+            self._cursors.pop()
+        await self.load()
+        await i.response.edit_message(**self.render())
+
+    @ui.button(label="下一頁", style=discord.ButtonStyle.secondary, custom_id="next_page", row=2)
+    @handler("pager.next_page")
+    async def next_page(self, i: Interaction, _: ui.Button) -> Any:
+        if self.items:
+            self._cursors.append(self.cursor(self.items[-1]))
+        await self.load()
+        await i.response.edit_message(**self.render())
+
+    @ui.button(label="搜尋", style=discord.ButtonStyle.primary, custom_id="search", row=2)
+    @handler("pager.search")
+    async def search(self, i: Interaction, _: ui.Button) -> Any:
+        modal = SearchModal(self.query)
+        await i.response.send_modal(modal)
+
+        timed_out = await modal.wait()
+        if timed_out or modal.interaction is None:
+            return
+
+        self.query = modal.query.value.strip()
+        self._cursors = [None]
+        await self.load()
+        await modal.interaction.edit_original_response(**self.render())
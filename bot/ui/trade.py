@@ -5,93 +5,116 @@ from typing import TYPE_CHECKING, Any
 import discord
 from discord import ui
 
-from bot.shioaji import AsyncShioaji
+from bot.config import CONFIG
+from bot.metrics import handler
+from bot.ui.pager import PagedView, add_quote_fields, quote_description
 from bot.utils import get_stock_name
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Hashable, Sequence
+    from types import EllipsisType
 
-    from shioaji.contracts import StreamStockContracts
     from shioaji.order import Trade
 
+    from bot.contracts import ContractCatalog
+    from bot.quotes import Quote
+    from bot.trade_book import TradeBook
     from bot.types import Interaction
+    from bot.ui.pager import QuoteSource
 
 
 class TradeDeleteConfirmView(ui.View):
-    def __init__(self, trade: Trade) -> None:
-        super().__init__(timeout=None)
+    def __init__(self, trade: Trade, account: str) -> None:
+        super().__init__(timeout=CONFIG.view_timeout)
         self.trade = trade
+        self.account = account
 
     @ui.button(label="確認取消", style=discord.ButtonStyle.danger, custom_id="confirm_delete")
+    @handler("trade.confirm_delete")
     async def confirm_delete(self, i: Interaction, _: ui.Button) -> Any:
         await i.response.defer()
 
-        async with AsyncShioaji() as api:
-            await api.cancel_order(self.trade)
+        trader = await i.client.get_trader()
+        if not await trader.cancel_trade(account=self.account, trade_id=self.trade.order.id):
+            await i.edit_original_response(content="找不到該預約單", view=None, embed=None)
+            return
+
         await i.edit_original_response(content="預約單已取消", view=None)
 
     @ui.button(label="取消", style=discord.ButtonStyle.secondary, custom_id="cancel_delete")
+    @handler("trade.cancel_delete")
     async def cancel_delete(self, i: Interaction, _: ui.Button) -> Any:
         await i.response.edit_message(content="已取消", view=None, embed=None)
 
 
-class TradeManageView(ui.View):
-    def __init__(self, trades: Sequence[Trade], stocks: StreamStockContracts) -> None:
-        super().__init__(timeout=None)
-        self.trade = trades[0]
-        self.stocks = stocks
+class TradeManageView(PagedView["Trade"]):
+    name = "trade"
+    placeholder = "選擇一個預約單"
+    empty_message = "沒有符合的預約單"
+
+    def __init__(  # noqa: PLR0913
+        self,
+        book: TradeBook,
+        catalog: ContractCatalog,
+        account: str,
+        quote_source: QuoteSource | None = None,
+        *,
+        timeout: float | EllipsisType | None = ...,
+        max_open_views: int | EllipsisType = ...,
+    ) -> None:
+        self.book = book
+        self.account = account
+        super().__init__(catalog, quote_source, timeout=timeout, max_open_views=max_open_views)
+
+    def version(self) -> int:
+        return self.book.version
+
+    async def fetch(self, after: Hashable | None, limit: int) -> Sequence[Trade]:
+        return self.book.page(after=after, prefix=self.query, limit=limit)  # pyright: ignore[reportArgumentType]
+
+    def key(self, item: Trade) -> str:
+        return item.order.id
+
+    def code(self, item: Trade) -> str:
+        return item.contract.code
+
+    def cursor(self, item: Trade) -> Hashable:
+        return (item.contract.code, item.order.id)
+
+    def option(self, item: Trade) -> discord.SelectOption:
+        code = item.contract.code
+        return discord.SelectOption(
+            label=f"{item.order.id} | [{code}] {get_stock_name(code, self.catalog)}",
+            description=f"價格: {item.order.price}, 數量: {item.order.quantity}"
+            + quote_description(self.quotes.get(code)),
+            value=item.order.id,
+        )
 
-        self.add_item(TradeSelect(trades=trades, stocks=stocks))
+    def build_embed(self, item: Trade) -> discord.Embed:
+        return get_trade_embed(item, self.catalog, self.quotes.get(item.contract.code))
 
     @ui.button(label="取消", style=discord.ButtonStyle.danger, custom_id="delete_trade", row=1)
+    @handler("trade.delete_trade")
     async def delete_trade(self, i: Interaction, _: ui.Button) -> Any:
-        view = TradeDeleteConfirmView(self.trade)
-        await i.response.edit_message(content="你確定要取消這個預約單嗎?", view=view)
-
-
-class TradeSelect(ui.Select):
-    def __init__(self, trades: Sequence[Trade], stocks: StreamStockContracts) -> None:
-        super().__init__(
-            options=[
-                discord.SelectOption(
-                    label=f"{t.order.id} | [{t.contract.code}] {get_stock_name(t.contract.code, stocks)}",
-                    description=f"價格: {t.order.price}, 數量: {t.order.quantity}",
-                    value=t.order.id,
-                    default=t.order.id == trades[0].order.id,
-                )
-                for t in trades
-            ],
-            placeholder="選擇一個預約單",
-            custom_id="trade_select",
-        )
-        self.trades = trades
-        self.stocks = stocks
-
-    @staticmethod
-    def get_embed(trade: Trade, stocks: StreamStockContracts) -> discord.Embed:
-        embed = discord.Embed(title="預約單詳情", color=discord.Color.purple())
-        embed.add_field(name="預約單 ID", value=str(trade.order.id), inline=False)
-        embed.add_field(
-            name="股票",
-            value=f"[{trade.contract.code}] {get_stock_name(trade.contract.code, stocks)}",
-            inline=False,
-        )
-        embed.add_field(name="價格", value=str(trade.order.price), inline=False)
-        embed.add_field(name="數量", value=str(trade.order.quantity), inline=False)
-        return embed
-
-    async def callback(self, i: Interaction) -> Any:
-        self.view: TradeManageView
-        await i.response.defer()
-
-        for o in self.options:
-            o.default = o.value in self.values
-
-        trade = next((t for t in self.trades if t.order.id == self.values[0]), None)
-        if trade is None:
+        if self.selected is None:
             await i.response.send_message("找不到該預約單", ephemeral=True)
             return
 
-        self.view.trade = trade
-        embed = self.get_embed(trade, self.stocks)
-        await i.edit_original_response(embed=embed, view=self.view)
+        view = TradeDeleteConfirmView(self.selected, self.account)
+        await i.response.edit_message(content="你確定要取消這個預約單嗎?", view=view)
+
+
+def get_trade_embed(
+    trade: Trade, catalog: ContractCatalog, quote: Quote | None = None
+) -> discord.Embed:
+    embed = discord.Embed(title="預約單詳情", color=discord.Color.purple())
+    embed.add_field(name="預約單 ID", value=str(trade.order.id), inline=False)
+    embed.add_field(
+        name="股票",
+        value=f"[{trade.contract.code}] {get_stock_name(trade.contract.code, catalog)}",
+        inline=False,
+    )
+    embed.add_field(name="價格", value=str(trade.order.price), inline=False)
+    embed.add_field(name="數量", value=str(trade.order.quantity), inline=False)
+    add_quote_fields(embed, trade.contract.code, float(trade.order.price), quote, catalog)
+    return embed
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import datetime
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import NamedTuple
+
+from loguru import logger
+
+from bot.config import CONFIG
+from bot.constants import UTC8
+from bot.metrics import LOOP_LAG, LOOP_STALLS
+
+WINDOW = 3000
+"""Lag samples kept for percentiles, 5 minutes at the default interval."""
+REPORT_INTERVAL = 60.0
+"""Seconds between lag summaries in the log."""
+
+
+class Stall(NamedTuple):
+    at: datetime.datetime
+    seconds: float
+    """How long the loop had been blocked when the stack was captured."""
+    stack: str
+
+
+class LagSummary(NamedTuple):
+    samples: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+class LoopWatchdog:
+    """Measures how late the event loop wakes up a task, and catches what blocks it.
+
+    A task sleeps for `CONFIG.loop_lag_interval` in a loop and records how much longer
+    the sleep took, which is the time other callbacks held the loop. A separate thread
+    watches the task's heartbeat, and when the loop has been stuck for longer than
+    `CONFIG.loop_lag_threshold` it logs the loop thread's stack while it is still blocked.
+    """
+
+    def __init__(self) -> None:
+        self.lags: deque[float] = deque(maxlen=WINDOW)
+        self.stalls: deque[Stall] = deque(maxlen=5)
+        self._beat = time.monotonic()
+        self._reported_beat: float | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def summary(self) -> LagSummary | None:
+        """Return percentiles of the recent lag samples, None before the first one."""
+        if not self.lags:
+            return None
+
+        lags = sorted(self.lags)
+
+        def percentile(q: float) -> float:
+            return lags[min(len(lags) - 1, int(q * len(lags)))]
+
+        return LagSummary(len(lags), percentile(0.5), percentile(0.9), percentile(0.99), lags[-1])
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        reported_at = loop.time()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(CONFIG.loop_lag_interval)
+            now = loop.time()
+            self._beat = time.monotonic()
+            lag = max(0.0, now - started - CONFIG.loop_lag_interval)
+            self.lags.append(lag)
+            LOOP_LAG.observe(lag)
+
+            if now - reported_at >= REPORT_INTERVAL:
+                reported_at = now
+                self._report()
+
+    def _report(self) -> None:
+        summary = self.summary()
+        if summary is None:
+            return
+
+        message = (
+            f"Event loop lag p50 {summary.p50 * 1000:.1f}ms, p90 {summary.p90 * 1000:.1f}ms, "
+            f"p99 {summary.p99 * 1000:.1f}ms, max {summary.max * 1000:.1f}ms"
+        )
+        if summary.p99 > CONFIG.loop_lag_threshold:
+            logger.warning(message)
+        else:
+            logger.debug(message)
+
+    def _watch(self) -> None:
+        # Runs in its own thread, so it keeps running while the loop is blocked
+        while not self._stop.wait(CONFIG.loop_lag_threshold / 2):
+            beat = self._beat
+            blocked = time.monotonic() - beat - CONFIG.loop_lag_interval
+            if blocked <= CONFIG.loop_lag_threshold or beat == self._reported_beat:
+                continue
+
+            # Report every stall once, with the stack of the code that is blocking
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)  # pyright: ignore[reportArgumentType]
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.stalls.append(Stall(datetime.datetime.now(UTC8), blocked, stack))
+            LOOP_STALLS.inc()
+            logger.warning(f"Event loop blocked for {blocked:.3f}s, stack:\n{stack}")
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+
+WATCHDOG = LoopWatchdog()
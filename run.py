@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import bot.startup  # noqa: F401, imported first so that the import phase is timed
+
+# isort: split
 import asyncio
 import contextlib
 
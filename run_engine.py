@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from bot.startup import STARTUP  # Imported first so that the import phase is timed
+
+# isort: split
+import asyncio
+import contextlib
+from pathlib import Path
+
+from bot.config import CONFIG
+from bot.contracts import ContractCatalog
+from bot.db.migrations import migrate
+from bot.db.models.order import ORDER_CACHE
+from bot.ipc import EngineServer
+from bot.logging import setup_logging
+from bot.metrics import MetricsServer
+from bot.trading import TradingEngine, create_pool
+from bot.watchdog import WATCHDOG
+
+
+async def main() -> None:
+    if CONFIG.engine_socket is None:
+        msg = "ENGINE_SOCKET must be set to run the trading engine in its own process"
+        raise ValueError(msg)
+
+    STARTUP.mark("imports")
+    contracts = ContractCatalog(Path(CONFIG.contract_catalog_path))
+    engine = TradingEngine(create_pool(contracts))
+    server = EngineServer(engine, CONFIG.engine_socket)
+    metrics = (
+        MetricsServer(CONFIG.metrics_host, CONFIG.engine_metrics_port)
+        if CONFIG.engine_metrics_port is not None
+        else None
+    )
+
+    try:
+        await WATCHDOG.start()
+        if metrics is not None:
+            await metrics.start()
+        await migrate()
+        STARTUP.mark("migrations")
+        await ORDER_CACHE.start()
+        STARTUP.mark("order cache")
+        await engine.start()
+        await server.start()
+        STARTUP.mark("engine")
+        STARTUP.report()
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        await engine.close()
+        contracts.close()
+        await ORDER_CACHE.close()
+        if metrics is not None:
+            await metrics.close()
+        await WATCHDOG.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(main())
@@ -0,0 +1,160 @@
+"""Replay ticks through the simulated broker into `TriggerWatcher`.
+
+Runs without a Sinopac account or database: `python -m unittest discover tests`
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import TYPE_CHECKING
+from unittest import mock
+
+from loguru import logger
+
+os.environ.setdefault("DISCORD_TOKEN", "test")
+os.environ.setdefault("DB_URL", "postgresql+asyncpg://test@localhost/test")
+
+from bot.config import CONFIG, DEFAULT_ACCOUNT
+from bot.contracts import ContractCatalog
+from bot.db.models.trigger import Trigger, TriggerKind
+from bot.placement import PlacementEngine
+from bot.shioaji import ShioajiSession
+from bot.sim import SimMarket, SimShioaji, TickReplay
+from bot.triggers import TriggerWatcher
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+    from bot.placement import PlacementResult
+
+
+class TriggerTable:
+    """Stands in for the `trigger` table, keeps `fired_at` per trigger ID in memory."""
+
+    def __init__(self, triggers: Sequence[Trigger]) -> None:
+        self.triggers = {t.id: t for t in triggers}
+        self.fired: set[int] = set()
+        self.claims: list[int] = []
+
+    async def active(self, account: str) -> list[Trigger]:
+        return [t for i, t in self.triggers.items() if t.account == account and i not in self.fired]
+
+    async def claim_many(self, ids: Sequence[int]) -> set[int]:
+        claimed = set(ids) - self.fired
+        self.fired |= claimed
+        self.claims.extend(claimed)
+        return claimed
+
+    async def release_many(self, ids: Sequence[int]) -> None:
+        self.fired -= set(ids)
+
+    async def finish_many(self, results: Mapping[int, PlacementResult]) -> None:
+        self.fired -= {i for i, r in results.items() if r.trade is None and not r.ambiguous}
+
+
+class TriggerWatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        logger.disable("bot")
+        self.addCleanup(logger.enable, "bot")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Every sim stock has a reference price of 100 and a limit down of 90
+        self.market = SimMarket(contracts=10, latency=0, jitter=0, login_latency=0, seed=0)
+        self.catalog = ContractCatalog(Path(self.tmp.name) / "contracts.bin")
+        self.catalog.write_stocks(self.market.stocks)
+        self.addCleanup(self.catalog.close)
+
+        account = CONFIG.all_accounts()[0]
+        self.session = ShioajiSession(
+            self.catalog, account, api_factory=functools.partial(SimShioaji, market=self.market)
+        )
+        self.watcher = TriggerWatcher(
+            self.session, PlacementEngine(workers=1, rate_limit=CONFIG.order_rate_limit)
+        )
+        self.watcher._loop = asyncio.get_running_loop()
+
+    async def arm(self, *triggers: Trigger) -> TriggerTable:
+        table = TriggerTable(triggers)
+        for name in ("active", "claim_many", "release_many", "finish_many"):
+            patcher = mock.patch.object(Trigger, name, getattr(table, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        await self.watcher.arm()
+        return table
+
+    async def replay(self, *ticks: tuple[str, float]) -> None:
+        """Publish ticks from a thread like the SDK, then wait for the fired orders."""
+        await asyncio.to_thread(TickReplay(self.market, ticks).play)
+        # The ticks were handed to the loop before the thread's result
+        await asyncio.sleep(0)
+        await asyncio.gather(*self.watcher._firing)
+
+    def placed(self, code: str) -> list[float]:
+        return [t.order.price for t in self.market.trades.values() if t.contract.code == code]
+
+    @staticmethod
+    def trigger(trigger_id: int, kind: TriggerKind, threshold: float) -> Trigger:
+        return Trigger(
+            id=trigger_id,
+            account=DEFAULT_ACCOUNT,
+            stock_id="1001",
+            price=threshold if kind == TriggerKind.PRICE else 94.0,
+            quantity=1,
+            kind=kind,
+            threshold=threshold,
+        )
+
+    async def test_price_trigger_fires_once_at_threshold(self) -> None:
+        table = await self.arm(self.trigger(1, TriggerKind.PRICE, 95.0))
+
+        await self.replay(("1001", 99.0), ("1001", 95.5))
+        assert table.claims == []
+
+        await self.replay(("1001", 95.0), ("1001", 94.0), ("1001", 93.0))
+        assert table.claims == [1]
+        assert self.placed("1001") == [95.0]
+        assert len(self.watcher.index) == 0
+
+    async def test_drop_trigger_fires_below_reference(self) -> None:
+        # 5% below the reference price of 100
+        table = await self.arm(self.trigger(1, TriggerKind.DROP, 5.0))
+
+        await self.replay(("1001", 95.5))
+        assert table.claims == []
+
+        await self.replay(("1001", 94.9))
+        assert table.claims == [1]
+        assert self.placed("1001") == [94.0]
+
+    async def test_ticks_above_highest_threshold_are_dropped(self) -> None:
+        await self.arm(self.trigger(1, TriggerKind.PRICE, 95.0))
+
+        with mock.patch.object(self.watcher, "on_tick", wraps=self.watcher.on_tick) as on_tick:
+            await self.replay(("1001", 99.0), ("1001", 96.0), ("1002", 50.0))
+            on_tick.assert_not_called()
+
+            await self.replay(("1001", 94.0))
+            on_tick.assert_called_once_with("1001", 94.0)
+
+    async def test_failed_send_rearms_trigger(self) -> None:
+        table = await self.arm(self.trigger(1, TriggerKind.PRICE, 95.0))
+
+        with mock.patch.object(self.watcher.placement, "run", side_effect=RuntimeError("down")):
+            await self.replay(("1001", 95.0))
+        assert table.claims == [1]
+        assert table.fired == set()
+        assert len(self.watcher.index) == 1
+        assert self.placed("1001") == []
+
+        await self.replay(("1001", 94.5))
+        assert table.claims == [1, 1]
+        assert self.placed("1001") == [95.0]
+
+
+if __name__ == "__main__":
+    unittest.main()